@@ -0,0 +1,124 @@
+"""
+Automatic, deduplicated attendance for the camera loop.
+
+Replaces the 'o'-key append of one Name,Time row per detected face: every
+sighting of a known name updates that person's first-seen / last-seen of the
+day in memory, and the daily file Attendance/Attendance_<dd-mm-yyyy>.csv is
+rewritten from that table, with a header, at most every flush_every seconds and
+on close. The camera loop makes no filesystem calls, and each person has exactly
+one row per day.
+
+    sink = AttendanceSink('Attendance')
+    sink.record(name)   # every frame, for every recognised face
+    sink.close()
+
+    Name,First Seen,Last Seen
+    Shubham Dey,20:03-50,20:04-47
+"""
+import os
+import csv
+import time
+from datetime import datetime
+
+from recognizer import UNKNOWN
+
+HEADER = ['Name', 'First Seen', 'Last Seen']
+DATE_FORMAT = "%d-%m-%Y"
+TIME_FORMAT = "%H:%M-%S"
+
+
+class AttendanceSink:
+    """
+    Sightings of a name within window seconds of its last counted sighting are
+    dropped as duplicates, so window is also the resolution of Last Seen.
+    UNKNOWN and empty names are never recorded. An existing file for the day is
+    merged in on start, including the old headerless Name,Time files.
+    """
+
+    def __init__(self, directory='Attendance', window=10.0, flush_every=30.0, clock=time.time):
+        self.directory = directory
+        self.window = window
+        self.flush_every = flush_every
+        self.clock = clock
+        os.makedirs(directory, exist_ok=True)
+        self.date = None
+        self.people = {}       # name -> [first seen, last seen], as TIME_FORMAT strings
+        self._last_counted = {}  # name -> clock() of the last sighting that was not a duplicate
+        self._dirty = False
+        self._last_flush = clock()
+
+    def path(self, date=None):
+        return os.path.join(self.directory, "Attendance_" + (date or self.date) + ".csv")
+
+    def record(self, name, ts=None):
+        """
+        Counts a sighting of name at ts (default now). Returns True if it changed the table.
+        """
+        if not name or name == UNKNOWN:
+            return False
+        ts = self.clock() if ts is None else ts
+        name = str(name)
+        last = self._last_counted.get(name)
+        if last is not None and 0 <= ts - last < self.window:
+            self._maybe_flush(ts)
+            return False
+        stamp = datetime.fromtimestamp(ts)
+        date = stamp.strftime(DATE_FORMAT)
+        if date != self.date:
+            self._start_day(date)
+        self._last_counted[name] = ts
+        seen = stamp.strftime(TIME_FORMAT)
+        if name in self.people:
+            self.people[name][1] = max(self.people[name][1], seen)
+        else:
+            self.people[name] = [seen, seen]
+        self._dirty = True
+        self._maybe_flush(ts)
+        return True
+
+    def _start_day(self, date):
+        self.flush()
+        self.date = date
+        self.people = self._read(self.path())
+        self._last_counted = {}
+
+    @staticmethod
+    def _read(path):
+        people = {}
+        if not os.path.exists(path):
+            return people
+        with open(path, newline='') as f:
+            for row in csv.reader(f):
+                row = [v.strip() for v in row if v.strip()]
+                if len(row) < 2 or row == HEADER:
+                    continue
+                name, first, last = row[0], row[1], row[-1]
+                if name in people:
+                    first, last = min(first, people[name][0]), max(last, people[name][1])
+                people[name] = [first, last]
+        return people
+
+    def _maybe_flush(self, ts):
+        if self._dirty and ts - self._last_flush >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Rewrites the day's file from the in-memory table if anything changed.
+        """
+        self._last_flush = self.clock()
+        if not self._dirty or self.date is None:
+            return
+        path = self.path()
+        tmp = path + '.tmp'
+        with open(tmp, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(HEADER)
+            for name, (first, last) in sorted(self.people.items(), key=lambda item: item[1][0]):
+                writer.writerow([name, first, last])
+        # The table holds every row of the day, so replacing the file never loses one
+        os.replace(tmp, path)
+        self._dirty = False
+
+    def close(self):
+        self.flush()
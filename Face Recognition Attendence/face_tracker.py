@@ -0,0 +1,179 @@
+"""
+Detect-once, track-between face pipeline for the attendance camera loop.
+
+The Haar cascade runs on a downscaled grey frame every detect_every frames; in
+between, each face is carried by template matching in a small window around its
+last position. Recognition runs when a track is born and again every
+verify_every frames, with all due tracks of a frame batched into one predict();
+each track keeps a running vote over its predictions, so its label does not
+flicker between neighbours from frame to frame.
+
+    tracker = FaceTracker(facedetect, recognizer)
+    for track in tracker.update(frame):
+        x, y, w, h = track.box
+        track.name, track.distance
+"""
+import itertools
+import cv2
+import numpy as np
+
+from recognizer import UNKNOWN
+
+
+def _iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0.0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0.0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FaceTrack:
+    """
+    One face followed across frames. box is (x, y, w, h) in full-frame pixels.
+    """
+
+    def __init__(self, track_id, box, scale):
+        self.id = track_id
+        self.scale = scale
+        self.small_box = np.asarray(box, dtype=np.float32)  # in the downscaled frame
+        self.template = None
+        self.misses = 0           # detections in a row this track was not matched to
+        self.votes = {}           # name -> number of predictions for it
+        self.name = None
+        self.distance = None
+        self.verified_at = None   # frame index of the last recognition
+
+    @property
+    def box(self):
+        return tuple(int(round(v / self.scale)) for v in self.small_box)
+
+    def vote(self, name, distance):
+        self.votes[name] = self.votes.get(name, 0) + 1
+        # Known names win ties against UNKNOWN: one blurry frame should not unname a track
+        self.name = max(self.votes, key=lambda n: (self.votes[n], n != UNKNOWN))
+        if self.name == name:
+            self.distance = float(distance)
+
+
+class FaceTracker:
+    """
+    detector is a cv2.CascadeClassifier, recognizer anything with
+    predict(features (n, 50*50*3)) -> (names, distances), i.e. a FaceRecognizer.
+    Tracks without a detection for max_misses detection rounds are dropped;
+    tracks still named UNKNOWN are re-verified every detect_every frames
+    instead of every verify_every.
+    """
+
+    def __init__(self, detector, recognizer, detect_every=5, scale=0.5, verify_every=30,
+                 iou_threshold=0.3, max_misses=1, min_score=0.5, crop_size=(50, 50),
+                 scale_factor=1.3, min_neighbors=5):
+        self.detector = detector
+        self.recognizer = recognizer
+        self.detect_every = detect_every
+        self.scale = scale
+        self.verify_every = verify_every
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.min_score = min_score
+        self.crop_size = crop_size
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.tracks = []
+        self.frame_idx = 0
+        self.detections_run = 0
+        self.recognitions_run = 0
+        self._ids = itertools.count()
+
+    def update(self, frame):
+        """
+        Advances every track to this frame and returns the live tracks.
+        """
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        if self.frame_idx % self.detect_every == 0:
+            self._detect(gray)
+        else:
+            for track in self.tracks:
+                self._follow(track, gray)
+        self._recognize(frame)
+        self.frame_idx += 1
+        return self.tracks
+
+    def _detect(self, gray):
+        self.detections_run += 1
+        # Haar minimum window is 24x24, which limits the smallest face to 24 / scale pixels
+        boxes = self.detector.detectMultiScale(gray, self.scale_factor, self.min_neighbors)
+        boxes = [tuple(float(v) for v in b) for b in boxes]
+        pairs = sorted(((_iou(t.small_box, b), ti, bi) for ti, t in enumerate(self.tracks)
+                        for bi, b in enumerate(boxes)), reverse=True)
+        matched_tracks, matched_boxes = set(), set()
+        for iou, ti, bi in pairs:
+            if iou < self.iou_threshold:
+                break
+            if ti in matched_tracks or bi in matched_boxes:
+                continue
+            matched_tracks.add(ti)
+            matched_boxes.add(bi)
+            track = self.tracks[ti]
+            track.small_box = np.asarray(boxes[bi], dtype=np.float32)
+            track.misses = 0
+            self._set_template(track, gray)
+        live = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+                self._follow(track, gray)
+            live.append(track)
+        for bi, b in enumerate(boxes):
+            if bi not in matched_boxes:
+                track = FaceTrack(next(self._ids), b, self.scale)
+                self._set_template(track, gray)
+                live.append(track)
+        self.tracks = live
+
+    def _set_template(self, track, gray):
+        x, y, w, h = (int(round(v)) for v in track.small_box)
+        template = gray[max(y, 0):y + h, max(x, 0):x + w]
+        # A flat patch matches anywhere equally well; such a track waits for the next detection
+        track.template = template.copy() if template.size and template.std() > 2 else None
+
+    def _follow(self, track, gray):
+        """
+        Moves the track to the best template match within half a face of its last position.
+        """
+        if track.template is None:
+            return
+        th, tw = track.template.shape
+        x, y, w, h = track.small_box
+        x0, y0 = max(int(x - w / 2), 0), max(int(y - h / 2), 0)
+        x1, y1 = min(int(x + w * 1.5), gray.shape[1]), min(int(y + h * 1.5), gray.shape[0])
+        window = gray[y0:y1, x0:x1]
+        if window.shape[0] < th or window.shape[1] < tw:
+            return
+        scores = cv2.matchTemplate(window, track.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (mx, my) = cv2.minMaxLoc(scores)
+        if score >= self.min_score:
+            track.small_box[:2] = (x0 + mx, y0 + my)
+
+    def _recognize(self, frame):
+        due = [t for t in self.tracks if t.verified_at is None
+               or self.frame_idx - t.verified_at >= (self.detect_every if t.name == UNKNOWN else self.verify_every)]
+        crops, tracks = [], []
+        for track in due:
+            x, y, w, h = track.box
+            crop = frame[max(y, 0):y + h, max(x, 0):x + w, :]
+            if crop.size:
+                crops.append(cv2.resize(crop, self.crop_size).flatten())
+                tracks.append(track)
+        if not crops:
+            return
+        self.recognitions_run += len(crops)
+        names, distances = self.recognizer.predict(np.array(crops))
+        for track, name, distance in zip(tracks, names, distances):
+            track.vote(name, distance)
+            track.verified_at = self.frame_idx
@@ -0,0 +1,268 @@
+"""
+Face recognition engine for attendance: replaces KNeighborsClassifier on raw
+7500-dim pixels.
+
+Faces are projected with PCA followed by LDA (Fisherfaces) into a small
+embedding, L2-normalised and kept in one contiguous float32 matrix, so the top-k
+gallery samples of a whole frame's faces come out of a single matrix multiply.
+Every answer carries a cosine distance, and faces farther than the threshold
+from everyone enrolled are reported as unknown. The fitted model is saved next
+to the gallery and only refitted when the gallery changes.
+
+    recognizer = FaceRecognizer.load_or_fit(GalleryStore('data/gallery'), 'data/recognizer.npz')
+    names, distances = recognizer.predict(faces)   # faces: (n, 7500) flattened 50x50 crops
+"""
+import os
+import hashlib
+import numpy as np
+
+UNKNOWN = "Unknown"
+
+
+def _fingerprint(store):
+    # The generation and a hash of its log change with every enroll, remove or compact of a GalleryStore
+    digest = hashlib.sha1()
+    if os.path.exists(store.log_path):
+        with open(store.log_path, 'rb') as f:
+            digest.update(f.read())
+    return f"{store.generation}:{digest.hexdigest()}"
+
+
+class FaceRecognizer:
+    """
+    PCA + LDA face embeddings with cosine top-k search and unknown rejection.
+    fit() learns the projection from the gallery samples; with a single enrolled
+    person LDA is undefined and the PCA embedding is used on its own.
+    threshold is the largest cosine distance still accepted as a match; by default
+    it is calibrated at fit time on held-out gallery samples and people (see
+    _calibrate); the calibrated value is kept either way.
+    """
+
+    def __init__(self, n_pca=100, k=5, threshold=None, shortlist=None):
+        self.n_pca = n_pca
+        self.k = k
+        self.threshold = threshold
+        self.calibrated_threshold = None
+        self.shortlist = shortlist # people compared exactly after a centroid pre-filter, None = everyone
+        self.mean = None
+        self.projection = None     # (dim, d) float32
+        self.gallery = None        # (N, d) float32, unit rows
+        self.labels = None         # (N,) names
+        self.names = None          # (P,) unique names
+        self.label_ids = None      # (N,) index into names
+        self.centroids = None      # (P, d) float32, unit rows
+        self.fingerprint = None
+
+    def fit(self, features, labels):
+        features = np.asarray(features, dtype=np.float32).reshape(len(features), -1)
+        labels = np.asarray(labels)
+        self._fit(features, labels)
+        self.calibrated_threshold = self._calibrate(features, labels)
+        if self.threshold is None:
+            self.threshold = self.calibrated_threshold
+        return self
+
+    def _fit(self, features, labels):
+        """
+        Learns the projection and builds the gallery, without the threshold.
+        """
+        self.names, self.label_ids = np.unique(labels, return_inverse=True)
+        self.mean = features.mean(axis=0)
+        centered = features - self.mean
+
+        # PCA: keep at most N - P components so the within-class scatter stays invertible for LDA
+        n_pca = max(1, min(self.n_pca, len(features) - len(self.names), features.shape[1]))
+        pca = self._pca(centered, n_pca)
+        reduced = centered @ pca
+
+        projection = pca
+        if len(self.names) > 1:
+            projection = pca @ self._lda(reduced, self.label_ids, len(self.names))
+        self.projection = np.ascontiguousarray(projection, dtype=np.float32)
+        self.labels = labels
+        self.gallery = self.embed(features, centered=False)
+        self._build_centroids()
+
+    @staticmethod
+    def _pca(x, n_components, oversample=10, power_iterations=3, seed=0):
+        """
+        Top principal directions (dim, n_components) of centered rows x, by a
+        randomized range finder: a full SVD of a few hundred people x 100 samples
+        x 7500 pixels takes minutes, this takes a couple of matrix products.
+        """
+        rng = np.random.default_rng(seed)
+        size = min(n_components + oversample, *x.shape)
+        basis, _ = np.linalg.qr(x.T @ rng.standard_normal((x.shape[0], size)).astype(x.dtype))
+        for _ in range(power_iterations):
+            basis, _ = np.linalg.qr(x.T @ (x @ basis))
+        _, _, vt = np.linalg.svd(x @ basis, full_matrices=False)
+        return (basis @ vt.T)[:, :n_components]
+
+    @staticmethod
+    def _lda(x, y, n_classes):
+        """
+        Fisher discriminant directions (at most n_classes - 1) of x.
+        """
+        dim = x.shape[1]
+        overall = x.mean(axis=0)
+        sw = np.zeros((dim, dim))
+        sb = np.zeros((dim, dim))
+        for c in range(n_classes):
+            xc = x[y == c]
+            mc = xc.mean(axis=0)
+            sw += (xc - mc).T @ (xc - mc)
+            sb += len(xc) * np.outer(mc - overall, mc - overall)
+        # Whiten the within-class scatter, then diagonalise the between-class scatter
+        evals, evecs = np.linalg.eigh(sw + 1e-6 * np.trace(sw) / dim * np.eye(dim))
+        whiten = evecs / np.sqrt(evals)
+        evals_b, evecs_b = np.linalg.eigh(whiten.T @ sb @ whiten)
+        order = np.argsort(evals_b)[::-1][:n_classes - 1]
+        return whiten @ evecs_b[:, order]
+
+    def _build_centroids(self):
+        centroids = np.zeros((len(self.names), self.gallery.shape[1]), dtype=np.float32)
+        np.add.at(centroids, self.label_ids, self.gallery)
+        self.centroids = centroids / np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+    def _calibrate(self, features, labels, holdout=0.2, seed=0, chunk=1024):
+        """
+        Threshold halfway between the genuine and impostor distances of faces the
+        projection was not fitted on, guarding the genuine side: a second model is
+        fitted without a holdout share of every person's samples (genuine probes)
+        and, with five or more people, without a holdout share of the people
+        altogether (impostor probes, i.e. simulated unknown visitors). In-sample
+        distances would make the threshold optimistically tight.
+        """
+        rng = np.random.default_rng(seed)
+        ids = self.label_ids
+        n_people = len(self.names)
+        outsiders = np.zeros(n_people, dtype=bool)
+        if n_people >= 5:
+            outsiders[rng.choice(n_people, max(1, int(round(holdout * n_people))), replace=False)] = True
+        probe = np.zeros(len(ids), dtype=bool)
+        for person in np.flatnonzero(~outsiders):
+            rows = np.flatnonzero(ids == person)
+            n = int(round(holdout * len(rows))) if len(rows) > 1 else 0
+            probe[rng.choice(rows, max(n, 1) if len(rows) > 1 else 0, replace=False)] = True
+        train = ~probe & ~outsiders[ids]
+
+        model = FaceRecognizer(n_pca=self.n_pca)
+        model._fit(features[train], labels[train])
+        genuine, impostor = [], []
+        queries = np.flatnonzero(~train)
+        for start in range(0, len(queries), chunk):
+            rows = queries[start:start + chunk]
+            # Queries a chunk at a time keep this O(chunk x N) in memory
+            sims = model.embed(features[rows]) @ model.gallery.T
+            same = labels[rows][:, None] == model.labels[None, :]
+            known = probe[rows]
+            if known.any():
+                genuine.append(1 - np.where(same[known], sims[known], -np.inf).max(axis=1))
+            impostor.append(1 - np.where(same, -np.inf, sims).max(axis=1))
+        genuine = np.concatenate(genuine) if genuine else np.empty(0)
+        impostor = np.concatenate(impostor) if impostor else np.empty(0)
+        high = np.percentile(genuine, 99) if len(genuine) else 0.5
+        if n_people < 2 or not len(impostor):
+            return float(min(2 * high, 1.0))
+        low = np.percentile(impostor, 1)
+        return float(max(high, (high + low) / 2))
+
+    def embed(self, features, centered=False):
+        """
+        Unit-length float32 embeddings (n, d) of flattened face crops.
+        """
+        x = np.asarray(features, dtype=np.float32).reshape(len(features), -1)
+        if not centered:
+            x = x - self.mean
+        e = x @ self.projection
+        return np.ascontiguousarray(e / np.maximum(np.linalg.norm(e, axis=1, keepdims=True), 1e-12))
+
+    def search(self, features, k=None):
+        """
+        Top-k gallery samples of each face: (indices (n, k), cosine distances (n, k)), nearest first.
+        """
+        k = min(k or self.k, len(self.gallery))
+        queries = self.embed(features)
+        if self.shortlist is not None and self.shortlist < len(self.names):
+            return self._search_shortlist(queries, k)
+        sims = queries @ self.gallery.T # one matmul for the whole frame
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_sims, axis=1)
+        return np.take_along_axis(top, order, axis=1), 1 - np.take_along_axis(top_sims, order, axis=1)
+
+    def _search_shortlist(self, queries, k):
+        """
+        Approximate search for large rosters: only the samples of the shortlist
+        people with the closest centroids are compared.
+        """
+        close = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :self.shortlist]
+        indices = np.zeros((len(queries), k), dtype=int)
+        distances = np.ones((len(queries), k), dtype=np.float32) * 2
+        for i, people in enumerate(close):
+            rows = np.flatnonzero(np.isin(self.label_ids, people))
+            sims = self.gallery[rows] @ queries[i]
+            kk = min(k, len(rows))
+            top = np.argsort(-sims)[:kk]
+            indices[i, :kk], distances[i, :kk] = rows[top], 1 - sims[top]
+        return indices, distances
+
+    def predict(self, features):
+        """
+        Name of each face by majority vote of its top-k samples and the distance to
+        the closest sample of that name; faces beyond the threshold are UNKNOWN.
+        """
+        if len(features) == 0:
+            return np.array([], dtype=object), np.array([], dtype=np.float32)
+        indices, distances = self.search(features)
+        names = np.empty(len(indices), dtype=object)
+        best = np.empty(len(indices), dtype=np.float32)
+        for i, (idx, dist) in enumerate(zip(indices, distances)):
+            votes = np.bincount(self.label_ids[idx], minlength=len(self.names))
+            winner = votes.argmax()
+            best[i] = dist[self.label_ids[idx] == winner].min()
+            names[i] = self.names[winner] if best[i] <= self.threshold else UNKNOWN
+        return names, best
+
+    def save(self, path):
+        np.savez(path, mean=self.mean, projection=self.projection, gallery=self.gallery, labels=self.labels,
+                 threshold=self.threshold, calibrated_threshold=self.calibrated_threshold,
+                 k=self.k, n_pca=self.n_pca,
+                 fingerprint=self.fingerprint or '')
+
+    @classmethod
+    def load(cls, path, shortlist=None):
+        data = np.load(path, allow_pickle=False)
+        self = cls(n_pca=int(data['n_pca']), k=int(data['k']), threshold=float(data['threshold']),
+                   shortlist=shortlist)
+        # Models saved before held-out calibration have none and are refitted by load_or_fit
+        self.calibrated_threshold = float(data['calibrated_threshold']) if 'calibrated_threshold' in data else None
+        self.mean, self.projection, self.gallery = data['mean'], data['projection'], data['gallery']
+        self.labels = data['labels']
+        self.names, self.label_ids = np.unique(self.labels, return_inverse=True)
+        # Models saved before the fingerprint was a string never match and are refitted by load_or_fit
+        self.fingerprint = str(data['fingerprint'])
+        self._build_centroids()
+        return self
+
+    @classmethod
+    def load_or_fit(cls, store, path, n_pca=100, k=5, threshold=None, shortlist=None):
+        """
+        Loads the model saved at path if it was fitted on the store's current
+        contents with the same n_pca, otherwise fits it on the store and saves it.
+        k, threshold and shortlist do not change the fit and are applied to a
+        loaded model as given (threshold=None means the calibrated one).
+        """
+        fingerprint = _fingerprint(store)
+        if os.path.exists(path):
+            model = cls.load(path, shortlist=shortlist)
+            if model.fingerprint == fingerprint and model.n_pca == n_pca \
+                    and model.calibrated_threshold is not None:
+                model.k = k
+                model.threshold = model.calibrated_threshold if threshold is None else threshold
+                return model
+        features, labels = store.arrays()
+        model = cls(n_pca=n_pca, k=k, threshold=threshold, shortlist=shortlist).fit(features, labels)
+        model.fingerprint = fingerprint
+        model.save(path)
+        return model
@@ -0,0 +1,32 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Face Reognition'))
+
+from gallery_store import GalleryStore
+from recognizer import FaceRecognizer
+
+
+def faces(seed, n=20):
+    return np.random.default_rng(seed).integers(0, 256, (n, 7500), dtype=np.uint8)
+
+
+def test_load_or_fit_refits_after_reenroll_and_compact(tmp_path):
+    store = GalleryStore(str(tmp_path / 'gallery'))
+    store.enroll('alice', faces(0))
+    store.enroll('bob', faces(1))
+    path = str(tmp_path / 'recognizer.npz')
+    first = FaceRecognizer.load_or_fit(store, path, n_pca=10)
+    assert FaceRecognizer.load_or_fit(store, path, n_pca=10).fingerprint == first.fingerprint
+
+    # Same rows, people and log size as before, only bob's faces differ
+    store.enroll('bob', faces(2), replace=True)
+    store.compact()
+    store = GalleryStore(str(tmp_path / 'gallery'))
+    refitted = FaceRecognizer.load_or_fit(store, path, n_pca=10)
+
+    assert refitted.fingerprint != first.fingerprint
+    assert not np.array_equal(refitted.gallery, first.gallery)
+    expected = FaceRecognizer(n_pca=10).fit(*store.arrays())
+    np.testing.assert_allclose(refitted.gallery, expected.gallery, atol=1e-5)
@@ -0,0 +1,283 @@
+"""
+Append-only face gallery: enrolled face features in one fixed-dtype matrix file
+that is memory-mapped for reading, plus a small log of who owns which rows.
+
+Enrolling a person appends only their rows and one log line, whatever the size
+of the gallery; removing or replacing a person appends a log line and leaves the
+rows in place until compact() is called. Replaces the faces_data.pkl / names.pkl
+pair that was re-read and re-pickled in full on every enrollment.
+
+    store = GalleryStore('data/gallery')
+    store.enroll(name, faces_data)         # (n, 7500) uint8, 50x50 BGR crops flattened
+    FACES, LABELS = store.arrays()         # live rows and their names
+"""
+import os
+import re
+import json
+import glob
+import pickle
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+FEATURE_DTYPE = np.uint8
+
+
+class GalleryStore:
+    """
+    Layout of <root>/:
+      meta.json        feature dimension, the current generation and whether
+                       import_pickles() has completed
+      lock             held while the generation is read or switched
+      features.u8      (N, dim) uint8 rows, append-only, memory-mapped for reads
+      people.jsonl     append-only log, one JSON object per line:
+                       {"op": "add", "id", "name", "start", "count"} - rows [start, start + count) of a person
+                                                                      ("imported": true if from the pickles)
+                       {"op": "remove", "id"}                         - the person's rows are dead
+    Rows are written before their log line, so an interrupted enrollment leaves
+    unreferenced rows that the next open cuts off. compact() writes generation
+    g + 1 as features.<g+1>.u8 / people.<g+1>.jsonl and switches to it by
+    atomically replacing meta.json, so the pair in use always belongs together.
+    The files of other generations are leftovers; they are deleted on open and
+    after a compact(), both under the lock, so an open never deletes the files
+    of a compact() running in another process.
+    """
+
+    def __init__(self, root, dim=None):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.meta_path = os.path.join(root, 'meta.json')
+        self.lock_path = os.path.join(root, 'lock')
+        self.dim = dim
+        self.generation = 0
+        self.migrated = False # import_pickles() has completed
+        self.people = {}  # person ID -> {'name', 'start', 'count', 'imported'} of enrolled, not removed people
+        self.rows = 0     # rows covered by the log
+        self._next_id = 0
+        self._features = None
+        with self._locked():
+            if os.path.exists(self.meta_path):
+                with open(self.meta_path) as f:
+                    meta = json.load(f)
+                self.dim = meta['dim']
+                self.generation = meta.get('generation', 0)
+                self.migrated = meta.get('migrated', False)
+            self.features_path, self.log_path = self._paths(self.generation)
+            self._remove_stale()
+            self._replay()
+
+    @contextmanager
+    def _locked(self):
+        """
+        Holds the store's lock file exclusively, waiting for other processes.
+        """
+        with open(self.lock_path, 'a+b') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            yield # closing the file releases the lock
+
+    def _paths(self, generation):
+        suffix = f".{generation}" if generation else ''
+        return (os.path.join(self.root, f'features{suffix}.u8'),
+                os.path.join(self.root, f'people{suffix}.jsonl'))
+
+    def _remove_stale(self):
+        # Files of an unfinished compact(), or of the generation a finished one replaced.
+        # Called with the lock held only.
+        for path in glob.glob(os.path.join(self.root, 'features*.u8*')) + \
+                glob.glob(os.path.join(self.root, 'people*.jsonl*')):
+            if path not in (self.features_path, self.log_path) and \
+                    re.fullmatch(r'(features(\.\d+)?\.u8|people(\.\d+)?\.jsonl)(\.tmp)?', os.path.basename(path)):
+                try:
+                    os.remove(path)
+                except OSError: # still mapped by a reader (Windows); removed on a later open
+                    pass
+
+    def _write_meta(self):
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'dim': self.dim, 'generation': self.generation, 'migrated': self.migrated}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.meta_path) # the single switch point between generations
+
+    def _replay(self):
+        """
+        Rebuilds the person index from the log, dropping a torn last line and rows no line refers to.
+        """
+        valid_bytes = 0
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'rb') as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b'\n'):
+                        break
+                    valid_bytes += len(line)
+                    self._apply(event)
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(valid_bytes)
+        if self.dim and os.path.exists(self.features_path):
+            with open(self.features_path, 'r+b') as f:
+                f.truncate(self.rows * self.dim * np.dtype(FEATURE_DTYPE).itemsize)
+
+    def _apply(self, event):
+        if event['op'] == 'add':
+            self.people[event['id']] = {'name': event['name'], 'start': event['start'], 'count': event['count'],
+                                        'imported': event.get('imported', False)}
+            self.rows = max(self.rows, event['start'] + event['count'])
+            self._next_id = max(self._next_id, event['id'] + 1)
+        elif event['op'] == 'remove':
+            self.people.pop(event['id'], None)
+
+    def _log(self, event):
+        with open(self.log_path, 'a') as f:
+            f.write(json.dumps(event) + '\n')
+        self._apply(event)
+
+    def __len__(self):
+        """
+        Number of live rows.
+        """
+        return sum(p['count'] for p in self.people.values())
+
+    @property
+    def names(self):
+        """
+        Enrolled names, in enrollment order.
+        """
+        return [p['name'] for _, p in sorted(self.people.items())]
+
+    def ids_of(self, name):
+        return [pid for pid, p in self.people.items() if p['name'] == name]
+
+    def enroll(self, name, features, replace=False):
+        """
+        Appends the feature rows (n, dim) of one person and returns their person ID.
+        With replace, earlier enrollments under the same name are removed.
+        """
+        if replace:
+            self.remove(name)
+        return self._append(name, features)
+
+    def _append(self, name, features, **extra):
+        features = np.ascontiguousarray(features, dtype=FEATURE_DTYPE)
+        features = features.reshape(len(features), -1)
+        if self.dim is None:
+            self.dim = features.shape[1]
+            self._write_meta()
+        if features.shape[1] != self.dim:
+            raise ValueError(f"Feature dimension {features.shape[1]} does not match the gallery's {self.dim}")
+        start = self.rows
+        with open(self.features_path, 'ab') as f:
+            features.tofile(f)
+        person_id = self._next_id
+        self._log({'op': 'add', 'id': person_id, 'name': name, 'start': start, 'count': len(features), **extra})
+        self._features = None
+        return person_id
+
+    def remove(self, name):
+        """
+        Removes every enrollment of a name. Returns the number of rows removed.
+        """
+        removed = 0
+        for person_id in self.ids_of(name):
+            removed += self.people[person_id]['count']
+            self._log({'op': 'remove', 'id': person_id})
+        return removed
+
+    def features(self):
+        """
+        All rows on disk as a read-only memmap (N, dim), removed ones included.
+        """
+        if self._features is None:
+            if not self.rows:
+                return np.empty((0, self.dim or 0), dtype=FEATURE_DTYPE)
+            self._features = np.memmap(self.features_path, dtype=FEATURE_DTYPE, mode='r',
+                                       shape=(self.rows, self.dim))
+        return self._features
+
+    def arrays(self):
+        """
+        Returns (features (n, dim), labels (n,)) of the live rows in enrollment order.
+        features is a zero-copy view of the memmap unless removed rows sit in
+        between (then it is gathered; compact() makes it zero-copy again).
+        """
+        people = [p for _, p in sorted(self.people.items())]
+        labels = np.array([p['name'] for p in people for _ in range(p['count'])])
+        features = self.features()
+        contiguous = all(a['start'] + a['count'] == b['start'] for a, b in zip(people, people[1:]))
+        if not people:
+            return features[:0], labels
+        if contiguous:
+            return features[people[0]['start']:people[-1]['start'] + people[-1]['count']], labels
+        rows = np.concatenate([np.arange(p['start'], p['start'] + p['count']) for p in people])
+        return np.asarray(features[rows]), labels
+
+    def compact(self):
+        """
+        Rewrites the gallery with only the live rows, as a new generation. The
+        only operation that rewrites the gallery; run it after many removals.
+        """
+        with self._locked():
+            self._compact()
+
+    def _compact(self):
+        features, _ = self.arrays()
+        features = np.array(features) # read everything before the old files are deleted
+        people = [(pid, p) for pid, p in sorted(self.people.items())]
+        generation = self.generation + 1
+        features_path, log_path = self._paths(generation)
+        with open(features_path, 'wb') as f:
+            features.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        start = 0
+        with open(log_path, 'w') as f:
+            for pid, p in people:
+                event = {'op': 'add', 'id': pid, 'name': p['name'], 'start': start, 'count': p['count']}
+                if p['imported']:
+                    event['imported'] = True
+                f.write(json.dumps(event) + '\n')
+                start += p['count']
+            f.flush()
+            os.fsync(f.fileno())
+        self._features = None
+        # A crash before this line keeps the old generation, after it the new one
+        self.generation = generation
+        self._write_meta()
+        self.features_path, self.log_path = features_path, log_path
+        self._remove_stale()
+        self.people, self.rows = {}, 0
+        self._replay()
+
+    def import_pickles(self, faces_path, names_path):
+        """
+        Enrolls the contents of an old faces_data.pkl / names.pkl pair, one
+        enrollment per run of equal consecutive names, and records in meta.json
+        that the migration is done (see migrated). People enrolled by an earlier,
+        interrupted import are removed first, so running it again completes it.
+        """
+        with open(faces_path, 'rb') as f:
+            faces = np.asarray(pickle.load(f))
+        with open(names_path, 'rb') as f:
+            names = list(pickle.load(f))
+        faces = faces.reshape(len(faces), -1)
+        for person_id in [pid for pid, p in self.people.items() if p['imported']]:
+            self._log({'op': 'remove', 'id': person_id})
+        start = 0
+        for i in range(1, len(names) + 1):
+            if i == len(names) or names[i] != names[start]:
+                self._append(names[start], faces[start:i], imported=True)
+                start = i
+        self.migrated = True
+        self._write_meta()
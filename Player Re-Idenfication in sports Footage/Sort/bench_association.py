@@ -0,0 +1,65 @@
+"""
+Micro-benchmark for associate_detections_to_trackers.
+
+Times the dense (full Hungarian) and gated association on synthetic frames with
+10 to 1000 objects spread at constant crowd density, so larger N means a wider
+shot rather than more overlap.
+
+    python bench_association.py
+    python bench_association.py --sizes 10 100 1000 --repeats 50
+"""
+from __future__ import print_function
+
+import time
+import argparse
+import numpy as np
+
+from sort import associate_detections_to_trackers
+
+
+def make_frame(n, rng, box=40., spacing=60., jitter=4., miss_rate=0.1):
+  """
+  Returns (detections, trackers) for n objects laid out with a mean spacing
+  between them; trackers are the detections moved by a few pixels, and a few
+  objects are missed or newly appeared.
+  """
+  side = spacing * np.sqrt(n)
+  xy = rng.uniform(0, side, (n, 2))
+  trks = np.column_stack((xy, xy + box))
+  dets = trks + rng.normal(0, jitter, trks.shape)
+  dets = dets[rng.random(n) > miss_rate]
+  extra = rng.uniform(0, side, (int(n * miss_rate), 2))
+  dets = np.vstack((dets, np.column_stack((extra, extra + box))))
+  return np.column_stack((dets, np.ones(len(dets)))), trks
+
+
+def bench(n, repeats, gated, iou_threshold, seed=0):
+  """
+  Returns the median association time in milliseconds over repeats frames.
+  """
+  rng = np.random.default_rng(seed)
+  frames = [make_frame(n, rng) for _ in range(repeats)]
+  times = []
+  for dets, trks in frames:
+    start = time.perf_counter()
+    associate_detections_to_trackers(dets, trks, iou_threshold, gated=gated)
+    times.append(time.perf_counter() - start)
+  return 1000 * np.median(times)
+
+
+def parse_args():
+  """Parse input arguments."""
+  parser = argparse.ArgumentParser(description='Association micro-benchmark')
+  parser.add_argument('--sizes', type=int, nargs='+', default=[10, 30, 100, 300, 1000], help='Objects per frame')
+  parser.add_argument('--repeats', type=int, default=20, help='Frames timed per size')
+  parser.add_argument('--iou_threshold', type=float, default=0.3, help='Minimum IOU for match.')
+  return parser.parse_args()
+
+
+if __name__ == '__main__':
+  args = parse_args()
+  print('%8s %12s %12s %8s' % ('objects', 'dense ms', 'gated ms', 'speedup'))
+  for n in args.sizes:
+    dense = bench(n, args.repeats, False, args.iou_threshold)
+    gated = bench(n, args.repeats, True, args.iou_threshold)
+    print('%8d %12.3f %12.3f %7.1fx' % (n, dense, gated, dense / gated if gated > 0 else 0.))
@@ -0,0 +1,75 @@
+"""
+Import-time benchmark for the SORT core module.
+
+Times each import in a fresh interpreter (median over repeats) and lists the
+GUI modules it dragged in. 'sort + display deps' is what every process paid
+when sort.py still imported matplotlib (TkAgg) and scikit-image at module level;
+those now only load with demo.py --display.
+
+    python bench_import.py
+    python bench_import.py --repeats 20
+"""
+from __future__ import print_function
+
+import os
+import sys
+import argparse
+import importlib.util
+import subprocess
+import numpy as np
+
+# (name, statement, module that must be installed to run it)
+CASES = [
+  ('numpy', 'import numpy', None),
+  ('sort', 'import sort', None),
+  ('sort + matplotlib', "import matplotlib; matplotlib.use('TkAgg'); import matplotlib.pyplot, matplotlib.patches; "
+                        "import sort", 'matplotlib'),
+  ('sort + skimage', 'from skimage import io; import sort', 'skimage'),
+]
+GUI_MODULES = ('matplotlib', 'tkinter', 'skimage', 'PIL')
+
+PROBE = '''
+import sys, time
+start = time.perf_counter()
+%s
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(','.join(m for m in %r if m in sys.modules))
+'''
+
+
+def time_import(statement, repeats):
+  """
+  Returns (median seconds, GUI modules loaded), or (None, error) if the import failed.
+  """
+  here = os.path.dirname(os.path.abspath(__file__))
+  times, loaded = [], ''
+  for _ in range(repeats):
+    proc = subprocess.run([sys.executable, '-c', PROBE % (statement, GUI_MODULES)], cwd=here,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+      return None, proc.stderr.strip().splitlines()[-1]
+    elapsed, loaded = proc.stdout.split('\n')[:2]
+    times.append(float(elapsed))
+  return float(np.median(times)), loaded
+
+
+def parse_args():
+  """Parse input arguments."""
+  parser = argparse.ArgumentParser(description='SORT import-time benchmark')
+  parser.add_argument('--repeats', type=int, default=10, help='Fresh interpreters per case')
+  return parser.parse_args()
+
+
+if __name__ == '__main__':
+  args = parse_args()
+  print('%-22s %10s  %s' % ('import', 'median ms', 'GUI modules loaded'))
+  for name, statement, requires in CASES:
+    if requires and importlib.util.find_spec(requires) is None:
+      print('%-22s %10s  (skipped: %s is not installed)' % (name, '-', requires))
+      continue
+    seconds, loaded = time_import(statement, args.repeats)
+    if seconds is None:
+      print('%-22s %10s  (%s)' % (name, '-', loaded))
+    else:
+      print('%-22s %10.1f  %s' % (name, 1000 * seconds, loaded or '-'))
@@ -0,0 +1,318 @@
+"""
+Tracking benchmark for Sort on MOT-format sequences.
+
+Runs a grid of max_age / min_hits / iou_threshold / gated settings over every sequence
+in <seq_path>/<phase>/*/ (det/det.txt, scored against gt/gt.txt), with the
+sequences spread over worker processes. Reports per-sequence FPS with per-frame
+latency percentiles and CLEAR-MOT / identity metrics (MOTA, MOTP, IDF1, ID
+switches) computed locally, saves everything as JSON, and flags regressions
+against an earlier run's JSON used as a baseline.
+
+    python bench_tracking.py --make_synthetic 4
+    python bench_tracking.py --max_age 1 3 5 --min_hits 1 3 --output baseline.json
+    python bench_tracking.py --max_age 1 3 5 --min_hits 1 3 --baseline baseline.json
+    python bench_tracking.py --gated 0 1
+
+FPS is measured per worker; run with --workers 1 for timings comparable across machines.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import itertools
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from sort import Sort, iou_batch, linear_assignment
+
+
+def make_sequence(path, frames=300, objects=20, size=(1920, 1080), miss_rate=0.1, fp_rate=0.05,
+                  jitter=2., seed=0):
+  """
+  Writes a synthetic MOT-format sequence: gt/gt.txt with objects that walk, turn
+  and enter / leave the scene, and det/det.txt with jittered, partly missed
+  detections of them plus false positives.
+  """
+  rng = np.random.default_rng(seed)
+  width, height = size
+  # Every object lives for a random span of the sequence, so IDs churn
+  total = objects * 2
+  start = rng.integers(0, frames * 2 // 3, total)
+  start[:objects] = 0
+  end = np.minimum(start + rng.integers(frames // 4, frames, total), frames)
+  wh = np.column_stack((rng.uniform(30, 60, total), rng.uniform(80, 160, total)))
+  pos = rng.uniform((0, 0), (width - 60, height - 160), (total, 2))
+  vel = rng.normal(0, 3, (total, 2))
+
+  gt_rows, det_rows = [], []
+  for frame in range(1, frames + 1):
+    alive = np.flatnonzero((start < frame) & (frame <= end))
+    vel[alive] += rng.normal(0, 0.3, (len(alive), 2))
+    pos[alive] += vel[alive]
+    # Bounce off the image borders
+    for axis, limit in ((0, width), (1, height)):
+      out = (pos[alive, axis] < 0) | (pos[alive, axis] + wh[alive, axis] > limit)
+      vel[alive[out], axis] *= -1
+      pos[alive, axis] = np.clip(pos[alive, axis], 0, limit - wh[alive, axis])
+    for i in alive:
+      gt_rows.append((frame, i + 1, pos[i, 0], pos[i, 1], wh[i, 0], wh[i, 1], 1, 1, 1))
+      if rng.random() >= miss_rate:
+        x, y = pos[i] + rng.normal(0, jitter, 2)
+        w, h = wh[i] * (1 + rng.normal(0, 0.03, 2))
+        det_rows.append((frame, -1, x, y, w, h, rng.uniform(0.5, 1.0), -1, -1, -1))
+    for _ in range(rng.poisson(fp_rate * max(len(alive), 1))):
+      x, y = rng.uniform((0, 0), (width - 60, height - 160))
+      det_rows.append((frame, -1, x, y, rng.uniform(30, 60), rng.uniform(80, 160), rng.uniform(0.3, 0.7), -1, -1, -1))
+
+  for sub, name, rows in (('gt', 'gt.txt', gt_rows), ('det', 'det.txt', det_rows)):
+    os.makedirs(os.path.join(path, sub), exist_ok=True)
+    with open(os.path.join(path, sub, name), 'w') as f:
+      for row in rows:
+        f.write('%d,%d,%.2f,%.2f,%.2f,%.2f,%s\n' % (row[:6] + (','.join('%g' % v for v in row[6:]),)))
+
+
+def load_mot(path, gt=False):
+  """
+  Loads a MOT det.txt / gt.txt as an (N, 7) array [frame, id, x1, y1, x2, y2, score].
+  Ground truth rows flagged as not to be considered (column 7 == 0) are dropped.
+  """
+  rows = np.loadtxt(path, delimiter=',', ndmin=2)
+  if gt and rows.shape[1] > 6:
+    rows = rows[rows[:, 6] != 0]
+  out = rows[:, :7].copy() if rows.shape[1] >= 7 else np.column_stack((rows[:, :6], np.ones(len(rows))))
+  out[:, 4:6] += out[:, 2:4] # [x, y, w, h] -> [x1, y1, x2, y2]
+  return out
+
+
+def evaluate(gt, hyp, iou_threshold=0.5):
+  """
+  CLEAR-MOT and identity metrics of tracker output hyp against ground truth gt,
+  both (N, >=6) arrays [frame, id, x1, y1, x2, y2, ...].
+  Matches are kept from frame to frame while their IoU stays above the threshold
+  and the rest are assigned with the Hungarian algorithm; IDF1 uses the global
+  one-to-one ID mapping that maximises the frames where the two IDs overlap.
+  Returns the counts and the derived scores as a dict.
+  """
+  gt_by_frame = {f: gt[gt[:, 0] == f] for f in np.unique(gt[:, 0])}
+  hyp_by_frame = {f: hyp[hyp[:, 0] == f] for f in np.unique(hyp[:, 0])}
+  fp = fn = idsw = matches = 0
+  iou_sum = 0.
+  last_match = {}     # gt ID -> hyp ID it was last matched to
+  current = {}        # gt ID -> hyp ID matched in the previous frame
+  overlap = defaultdict(int) # (gt ID, hyp ID) -> frames with IoU above the threshold
+
+  for frame in sorted(set(gt_by_frame) | set(hyp_by_frame)):
+    g = gt_by_frame.get(frame, np.empty((0, 7)))
+    h = hyp_by_frame.get(frame, np.empty((0, 7)))
+    g_ids, h_ids = g[:, 1].astype(int), h[:, 1].astype(int)
+    iou = iou_batch(g[:, 2:6], h[:, 2:6]) if len(g) and len(h) else np.zeros((len(g), len(h)))
+    valid = iou >= iou_threshold
+    for i, j in zip(*np.nonzero(valid)):
+      overlap[(g_ids[i], h_ids[j])] += 1
+
+    pairs = []
+    # Keep last frame's correspondences that still hold
+    h_index = {hid: j for j, hid in enumerate(h_ids)}
+    for i, gid in enumerate(g_ids):
+      j = h_index.get(current.get(gid))
+      if j is not None and valid[i, j]:
+        pairs.append((i, j))
+    free = valid.copy()
+    for i, j in pairs:
+      free[i, :] = False
+      free[:, j] = False
+    if free.any():
+      for i, j in linear_assignment(-np.where(free, iou, 0.)):
+        if free[i, j]:
+          pairs.append((i, j))
+
+    current = {}
+    for i, j in pairs:
+      gid, hid = g_ids[i], h_ids[j]
+      if gid in last_match and last_match[gid] != hid:
+        idsw += 1
+      last_match[gid] = current[gid] = hid
+      iou_sum += iou[i, j]
+    matches += len(pairs)
+    fn += len(g) - len(pairs)
+    fp += len(h) - len(pairs)
+
+  # Identity matching over whole trajectories
+  idtp = 0
+  if overlap:
+    gids = sorted(set(k[0] for k in overlap))
+    hids = sorted(set(k[1] for k in overlap))
+    gi = {g: i for i, g in enumerate(gids)}
+    hi = {h: j for j, h in enumerate(hids)}
+    counts = np.zeros((len(gids), len(hids)))
+    for (g, h), n in overlap.items():
+      counts[gi[g], hi[h]] = n
+    assigned = linear_assignment(-counts)
+    idtp = int(counts[assigned[:, 0], assigned[:, 1]].sum())
+
+  num_gt, num_hyp = len(gt), len(hyp)
+  return {
+    'gt': num_gt, 'hyp': num_hyp, 'matches': matches, 'fp': fp, 'fn': fn, 'idsw': idsw,
+    'idtp': idtp, 'iou_sum': iou_sum,
+    'mota': 1. - (fn + fp + idsw) / num_gt if num_gt else 0.,
+    'motp': iou_sum / matches if matches else 0.,
+    'idf1': 2. * idtp / (num_gt + num_hyp) if num_gt + num_hyp else 0.,
+  }
+
+
+def run_sequence(seq_dir, config):
+  """
+  Tracks one sequence with one config. Returns FPS, per-frame latency percentiles
+  and the metrics (when the sequence has ground truth).
+  """
+  dets = load_mot(os.path.join(seq_dir, 'det', 'det.txt'))
+  dets = dets[np.argsort(dets[:, 0], kind='stable')]
+  n_frames = int(dets[:, 0].max()) if len(dets) else 0
+  by_frame = np.split(dets, np.searchsorted(dets[:, 0], np.arange(2, n_frames + 1)))
+  # Warm up (lazy imports, first allocations) outside the timed loop
+  warmup = Sort(**config)
+  for frame_dets in by_frame[:3]:
+    warmup.update(frame_dets[:, 2:7])
+  tracker = Sort(**config)
+  times = np.zeros(n_frames)
+  output = []
+  for frame in range(1, n_frames + 1):
+    frame_dets = by_frame[frame - 1][:, 2:7]
+    start = time.perf_counter()
+    tracks = tracker.update(frame_dets)
+    times[frame - 1] = time.perf_counter() - start
+    if len(tracks):
+      output.append(np.column_stack((np.full(len(tracks), frame), tracks[:, 4], tracks[:, :4])))
+
+  ms = 1000 * times
+  result = {
+    'frames': n_frames,
+    'fps': n_frames / times.sum() if times.sum() > 0 else 0.,
+    'total_seconds': float(times.sum()),
+    'p50_ms': float(np.percentile(ms, 50)) if n_frames else 0.,
+    'p95_ms': float(np.percentile(ms, 95)) if n_frames else 0.,
+    'p99_ms': float(np.percentile(ms, 99)) if n_frames else 0.,
+  }
+  gt_path = os.path.join(seq_dir, 'gt', 'gt.txt')
+  if os.path.exists(gt_path):
+    hyp = np.vstack(output) if output else np.empty((0, 6))
+    result.update(evaluate(load_mot(gt_path, gt=True), hyp))
+  return result
+
+
+def summarise(sequences):
+  """
+  Overall numbers of one config: FPS over all frames, metrics over the summed counts.
+  """
+  results = list(sequences.values())
+  frames = sum(r['frames'] for r in results)
+  seconds = sum(r['total_seconds'] for r in results)
+  overall = {'frames': frames, 'fps': frames / seconds if seconds > 0 else 0.}
+  if all('gt' in r for r in results):
+    total = {k: sum(r[k] for r in results) for k in ('gt', 'hyp', 'matches', 'fp', 'fn', 'idsw', 'idtp', 'iou_sum')}
+    overall.update(
+      mota=1. - (total['fn'] + total['fp'] + total['idsw']) / total['gt'] if total['gt'] else 0.,
+      motp=total['iou_sum'] / total['matches'] if total['matches'] else 0.,
+      idf1=2. * total['idtp'] / (total['gt'] + total['hyp']) if total['gt'] + total['hyp'] else 0.,
+      idsw=total['idsw'])
+  return overall
+
+
+def config_name(config):
+  return 'max_age=%d,min_hits=%d,iou_threshold=%.2f%s' % (
+    config['max_age'], config['min_hits'], config['iou_threshold'], ',gated' if config['gated'] else '')
+
+
+def find_regressions(results, baseline, fps_tolerance=0.1, metric_tolerance=0.005):
+  """
+  Compares a run with a baseline run of the same configs and sequences.
+  Returns one message per FPS drop above fps_tolerance (relative) or MOTA / IDF1
+  drop above metric_tolerance (absolute).
+  """
+  flags = []
+  for name, config in results['configs'].items():
+    base = baseline.get('configs', {}).get(name)
+    if base is None:
+      continue
+    for seq, r in list(config['sequences'].items()) + [('overall', config['overall'])]:
+      b = base['sequences'].get(seq) if seq != 'overall' else base['overall']
+      if b is None:
+        continue
+      if b['fps'] > 0 and r['fps'] < b['fps'] * (1 - fps_tolerance):
+        flags.append('%s %s: FPS %.1f -> %.1f' % (name, seq, b['fps'], r['fps']))
+      for metric in ('mota', 'idf1'):
+        if metric in b and metric in r and r[metric] < b[metric] - metric_tolerance:
+          flags.append('%s %s: %s %.4f -> %.4f' % (name, seq, metric.upper(), b[metric], r[metric]))
+  return flags
+
+
+def parse_args():
+  """Parse input arguments."""
+  parser = argparse.ArgumentParser(description='SORT tracking benchmark')
+  parser.add_argument('--seq_path', help='Path to detections.', type=str, default='data')
+  parser.add_argument('--phase', help='Subdirectory in seq_path.', type=str, default='train')
+  parser.add_argument('--max_age', type=int, nargs='+', default=[1], help='Values of max_age to try')
+  parser.add_argument('--min_hits', type=int, nargs='+', default=[3], help='Values of min_hits to try')
+  parser.add_argument('--iou_threshold', type=float, nargs='+', default=[0.3], help='Values of iou_threshold to try')
+  parser.add_argument('--gated', type=int, nargs='+', choices=[0, 1], default=[0],
+                      help='Association to try: 0 dense, 1 gated')
+  parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes [all cores]')
+  parser.add_argument('--make_synthetic', type=int, default=0,
+                      help='Write this many synthetic sequences to seq_path/phase before running')
+  parser.add_argument('--output', default='bench_tracking.json', help='Results JSON [bench_tracking.json]')
+  parser.add_argument('--baseline', default=None, help='Results JSON of an earlier run to flag regressions against')
+  parser.add_argument('--fps_tolerance', type=float, default=0.1, help='Relative FPS drop flagged as a regression')
+  parser.add_argument('--metric_tolerance', type=float, default=0.005, help='MOTA / IDF1 drop flagged as a regression')
+  return parser.parse_args()
+
+
+if __name__ == '__main__':
+  args = parse_args()
+  root = os.path.join(args.seq_path, args.phase)
+  for k in range(args.make_synthetic):
+    make_sequence(os.path.join(root, 'synthetic-%02d' % (k + 1)), seed=k)
+  seq_dirs = sorted(os.path.dirname(os.path.dirname(p)) for p in glob.glob(os.path.join(root, '*', 'det', 'det.txt')))
+  if not seq_dirs:
+    print('No sequences found in %s (use --make_synthetic N to create some).' % root)
+    sys.exit(1)
+
+  configs = [dict(max_age=a, min_hits=m, iou_threshold=t, gated=bool(g))
+             for a, m, t, g in itertools.product(args.max_age, args.min_hits, args.iou_threshold, args.gated)]
+  tasks = [(config, seq_dir) for config in configs for seq_dir in seq_dirs]
+  with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(tasks)))) as pool:
+    outcomes = list(pool.map(run_sequence, [t[1] for t in tasks], [t[0] for t in tasks]))
+
+  results = {'seq_path': root, 'configs': {}}
+  for (config, seq_dir), outcome in zip(tasks, outcomes):
+    entry = results['configs'].setdefault(config_name(config), {'params': config, 'sequences': {}})
+    entry['sequences'][os.path.basename(seq_dir)] = outcome
+  for entry in results['configs'].values():
+    entry['overall'] = summarise(entry['sequences'])
+
+  print('%-48s %10s %9s %8s %8s %8s %6s' % ('config / sequence', 'FPS', 'p95 ms', 'MOTA', 'MOTP', 'IDF1', 'IDSW'))
+  for name, entry in results['configs'].items():
+    for seq, r in list(entry['sequences'].items()) + [('overall', entry['overall'])]:
+      label = name if seq == 'overall' else '  ' + seq
+      print('%-48s %10.1f %9s %8s %8s %8s %6s' % (
+        label, r['fps'], '%.3f' % r['p95_ms'] if 'p95_ms' in r else '',
+        '%.4f' % r['mota'] if 'mota' in r else '-', '%.4f' % r['motp'] if 'motp' in r else '-',
+        '%.4f' % r['idf1'] if 'idf1' in r else '-', r.get('idsw', '-')))
+
+  with open(args.output, 'w') as f:
+    json.dump(results, f, indent=2)
+  print('Results written to %s' % args.output)
+
+  if args.baseline:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    flags = find_regressions(results, baseline, args.fps_tolerance, args.metric_tolerance)
+    for flag in flags:
+      print('REGRESSION %s' % flag)
+    if flags:
+      sys.exit(1)
+    print('No regressions against %s' % args.baseline)
@@ -17,31 +17,19 @@
 """
 from __future__ import print_function
 
-import os
 import numpy as np
-import matplotlib
-matplotlib.use('TkAgg')
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from skimage import io
-
-import glob
-import time
-import argparse
-from filterpy.kalman import KalmanFilter
-
-np.random.seed(0)
 
 
 def linear_assignment(cost_matrix):
   try:
     import lap
     _, x, y = lap.lapjv(cost_matrix, extend_cost=True)
-    return np.array([[y[i],i] for i in x if i >= 0]) #
+    cols = x[x >= 0]
+    return np.stack((y[cols], cols), axis=1)
   except ImportError:
     from scipy.optimize import linear_sum_assignment
     x, y = linear_sum_assignment(cost_matrix)
-    return np.array(list(zip(x, y)))
+    return np.stack((x, y), axis=1)
 
 
 def iou_batch(bb_test, bb_gt):
@@ -63,6 +51,71 @@ def iou_batch(bb_test, bb_gt):
   return(o)  
 
 
+def iou_pairs(bb_test, bb_gt, test_idx, gt_idx):
+  """
+  Computes IOU only for the given (test_idx[k], gt_idx[k]) pairs of boxes in the form [x1,y1,x2,y2]
+  """
+  a = bb_test[test_idx]
+  b = bb_gt[gt_idx]
+  w = np.maximum(0., np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]))
+  h = np.maximum(0., np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]))
+  wh = w * h
+  return wh / ((a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1]) + (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]) - wh)
+
+
+def overlapping_pairs(bb_test, bb_gt):
+  """
+  Returns (test_idx, gt_idx) for the box pairs whose x-extents can overlap, found
+  with a sort and searchsorted sweep instead of the full N x M matrix. Every pair
+  left out has zero IOU.
+  """
+  if len(bb_test) == 0 or len(bb_gt) == 0:
+    return np.empty(0, dtype=int), np.empty(0, dtype=int)
+  order = np.argsort(bb_gt[:, 0], kind='stable')
+  gt_x1 = bb_gt[order, 0]
+  max_w = (bb_gt[:, 2] - bb_gt[:, 0]).max()
+  # gt overlaps test in x when gt.x1 < test.x2 and gt.x2 > test.x1 (so gt.x1 > test.x1 - max_w)
+  lo = np.searchsorted(gt_x1, bb_test[:, 0] - max_w, side='right')
+  hi = np.searchsorted(gt_x1, bb_test[:, 2], side='left')
+  counts = np.maximum(hi - lo, 0)
+  test_idx = np.repeat(np.arange(len(bb_test)), counts)
+  offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+  gt_idx = order[np.repeat(lo, counts) + offsets]
+  return test_idx, gt_idx
+
+
+def gated_assignment(detections, trackers, iou_threshold):
+  """
+  Assignment restricted to detection/track pairs that pass the IOU gate, without
+  building the dense IOU matrix. Pairs that are the only candidate of both their
+  detection and their track are matched directly, and only the remaining
+  ambiguous block goes through the assignment solver.
+
+  Returns the matched (detection, tracker) indices and their IOUs.
+  """
+  d, t = overlapping_pairs(detections, trackers)
+  iou = iou_pairs(detections, trackers, d, t)
+  keep = iou >= iou_threshold
+  d, t, iou = d[keep], t[keep], iou[keep]
+
+  row_n = np.bincount(d, minlength=len(detections))
+  col_n = np.bincount(t, minlength=len(trackers))
+  direct = (row_n[d] == 1) & (col_n[t] == 1)
+  matched = np.stack((d[direct], t[direct]), axis=1)
+  matched_iou = iou[direct]
+
+  if not direct.all():
+    d, t, iou = d[~direct], t[~direct], iou[~direct]
+    rows, ri = np.unique(d, return_inverse=True)
+    cols, ci = np.unique(t, return_inverse=True)
+    cost = np.zeros((len(rows), len(cols)))
+    cost[ri, ci] = -iou
+    m = linear_assignment(cost)
+    matched = np.concatenate((matched, np.stack((rows[m[:, 0]], cols[m[:, 1]]), axis=1)))
+    matched_iou = np.concatenate((matched_iou, -cost[m[:, 0], m[:, 1]]))
+  return matched, matched_iou
+
+
 def convert_bbox_to_z(bbox):
   """
   Takes a bounding box in the form [x1,y1,x2,y2] and returns z in the form
@@ -91,122 +144,201 @@ def convert_x_to_bbox(x,score=None):
     return np.array([x[0]-w/2.,x[1]-h/2.,x[0]+w/2.,x[1]+h/2.,score]).reshape((1,5))
 
 
-class KalmanBoxTracker(object):
+# Constant velocity model shared by all tracks: state is [x,y,s,r,vx,vy,vs]
+KF_F = np.array([[1,0,0,0,1,0,0],[0,1,0,0,0,1,0],[0,0,1,0,0,0,1],[0,0,0,1,0,0,0],  [0,0,0,0,1,0,0],[0,0,0,0,0,1,0],[0,0,0,0,0,0,1]], dtype=float)
+KF_H = np.array([[1,0,0,0,0,0,0],[0,1,0,0,0,0,0],[0,0,1,0,0,0,0],[0,0,0,1,0,0,0]], dtype=float)
+KF_R = np.eye(4)
+KF_R[2:,2:] *= 10.
+KF_P0 = np.eye(7)
+KF_P0[4:,4:] *= 1000. #give high uncertainty to the unobservable initial velocities
+KF_P0 *= 10.
+KF_Q = np.eye(7)
+KF_Q[-1,-1] *= 0.01
+KF_Q[4:,4:] *= 0.01
+
+
+def convert_bboxes_to_z(bboxes):
+  """
+  Vectorised convert_bbox_to_z: takes an (N,4+) array of [x1,y1,x2,y2] boxes and
+    returns an (N,4) array of [x,y,s,r]
   """
-  This class represents the internal state of individual tracked objects observed as bbox.
+  w = bboxes[:, 2] - bboxes[:, 0]
+  h = bboxes[:, 3] - bboxes[:, 1]
+  return np.stack((bboxes[:, 0] + w/2., bboxes[:, 1] + h/2., w * h, w / h.astype(float)), axis=1)
+
+
+def convert_x_to_bboxes(x):
+  """
+  Vectorised convert_x_to_bbox: takes an (N,7) array of states and returns an
+    (N,4) array of [x1,y1,x2,y2] boxes
+  """
+  w = np.sqrt(x[:, 2] * x[:, 3])
+  h = x[:, 2] / w
+  return np.stack((x[:, 0]-w/2., x[:, 1]-h/2., x[:, 0]+w/2., x[:, 1]+h/2.), axis=1)
+
+
+class KalmanBoxTracks(object):
   """
-  count = 0
-  def __init__(self,bbox):
+  This class represents the internal state of all tracked objects observed as bbox.
+  States are stored as one (N,7) array with stacked (N,7,7) covariances, so predict
+  and update run as single vectorised operations over every track.
+  IDs are counted per instance, so every Sort numbers its tracks from 0 whatever
+  ran before it in the same process.
+  """
+  def __init__(self):
+    self.count = 0
+    self.x = np.zeros((0, 7))
+    self.P = np.zeros((0, 7, 7))
+    self.id = np.zeros(0, dtype=int)
+    self.time_since_update = np.zeros(0, dtype=int)
+    self.hits = np.zeros(0, dtype=int)
+    self.hit_streak = np.zeros(0, dtype=int)
+    self.age = np.zeros(0, dtype=int)
+
+  def __len__(self):
+    return len(self.x)
+
+  def add(self, bboxes):
     """
-    Initialises a tracker using initial bounding box.
+    Initialises new tracks using initial bounding boxes, in order.
     """
-    #define constant velocity model
-    self.kf = KalmanFilter(dim_x=7, dim_z=4) 
-    self.kf.F = np.array([[1,0,0,0,1,0,0],[0,1,0,0,0,1,0],[0,0,1,0,0,0,1],[0,0,0,1,0,0,0],  [0,0,0,0,1,0,0],[0,0,0,0,0,1,0],[0,0,0,0,0,0,1]])
-    self.kf.H = np.array([[1,0,0,0,0,0,0],[0,1,0,0,0,0,0],[0,0,1,0,0,0,0],[0,0,0,1,0,0,0]])
-
-    self.kf.R[2:,2:] *= 10.
-    self.kf.P[4:,4:] *= 1000. #give high uncertainty to the unobservable initial velocities
-    self.kf.P *= 10.
-    self.kf.Q[-1,-1] *= 0.01
-    self.kf.Q[4:,4:] *= 0.01
-
-    self.kf.x[:4] = convert_bbox_to_z(bbox)
-    self.time_since_update = 0
-    self.id = KalmanBoxTracker.count
-    KalmanBoxTracker.count += 1
-    self.history = []
-    self.hits = 0
-    self.hit_streak = 0
-    self.age = 0
-
-  def update(self,bbox):
+    n = len(bboxes)
+    if n == 0:
+      return
+    x = np.zeros((n, 7))
+    x[:, :4] = convert_bboxes_to_z(bboxes)
+    self.x = np.concatenate((self.x, x))
+    self.P = np.concatenate((self.P, np.broadcast_to(KF_P0, (n, 7, 7))))
+    self.id = np.concatenate((self.id, np.arange(self.count, self.count + n)))
+    self.count += n
+    zeros = np.zeros(n, dtype=int)
+    self.time_since_update = np.concatenate((self.time_since_update, zeros))
+    self.hits = np.concatenate((self.hits, zeros))
+    self.hit_streak = np.concatenate((self.hit_streak, zeros))
+    self.age = np.concatenate((self.age, zeros))
+
+  def keep(self, mask):
     """
-    Updates the state vector with observed bbox.
+    Compacts the arrays to the tracks selected by a boolean mask (track births keep order).
     """
-    self.time_since_update = 0
-    self.history = []
-    self.hits += 1
-    self.hit_streak += 1
-    self.kf.update(convert_bbox_to_z(bbox))
-
-  def predict(self):
+    self.x = self.x[mask]
+    self.P = self.P[mask]
+    self.id = self.id[mask]
+    self.time_since_update = self.time_since_update[mask]
+    self.hits = self.hits[mask]
+    self.hit_streak = self.hit_streak[mask]
+    self.age = self.age[mask]
+
+  def update(self, idx, bboxes):
     """
-    Advances the state vector and returns the predicted bounding box estimate.
+    Updates the state vectors of the tracks at idx with their observed bboxes.
     """
-    if((self.kf.x[6]+self.kf.x[2])<=0):
-      self.kf.x[6] *= 0.0
-    self.kf.predict()
+    if len(idx) == 0:
+      return
+    self.time_since_update[idx] = 0
+    self.hits[idx] += 1
+    self.hit_streak[idx] += 1
+
+    x, P = self.x[idx], self.P[idx]
+    y = convert_bboxes_to_z(bboxes) - x[:, :4]      # innovation (H picks the first 4 states)
+    PHT = P[:, :, :4]
+    S = PHT[:, :4, :] + KF_R
+    K = PHT @ np.linalg.inv(S)
+    self.x[idx] = x + np.einsum('nij,nj->ni', K, y)
+    I_KH = np.eye(7) - K @ KF_H
+    # Joseph form, as used by filterpy
+    self.P[idx] = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ KF_R @ K.transpose(0, 2, 1)
+
+  def predict(self, missed=True):
+    """
+    Advances all state vectors and returns the predicted bounding box estimates.
+    With missed=False (frames skipped by a keyframe detector) the step does not
+    count as a frame without an associated detection.
+    """
+    self.x[(self.x[:, 6] + self.x[:, 2]) <= 0, 6] = 0.
+    self.x = self.x @ KF_F.T
+    self.P = KF_F @ self.P @ KF_F.T + KF_Q
     self.age += 1
-    if(self.time_since_update>0):
-      self.hit_streak = 0
-    self.time_since_update += 1
-    self.history.append(convert_x_to_bbox(self.kf.x))
-    return self.history[-1]
+    if(missed):
+      self.hit_streak[self.time_since_update > 0] = 0
+      self.time_since_update += 1
+    return self.get_state()
 
   def get_state(self):
     """
-    Returns the current bounding box estimate.
+    Returns the current bounding box estimates.
     """
-    return convert_x_to_bbox(self.kf.x)
+    return convert_x_to_bboxes(self.x)
 
 
-def associate_detections_to_trackers(detections,trackers,iou_threshold = 0.3):
+def associate_detections_to_trackers(detections,trackers,iou_threshold = 0.3,gated=False):
   """
   Assigns detections to tracked object (both represented as bounding boxes)
 
+  With gated=True only pairs whose boxes overlap are scored and the assignment is
+  only solved over pairs whose IOU passes the threshold (see gated_assignment),
+  skipping both the dense IOU matrix and the Hungarian solve for disjoint
+  detection/track pairs. It can differ from the dense mode only where the dense
+  solve would trade a match above the threshold for pairs below it.
+
   Returns 3 lists of matches, unmatched_detections and unmatched_trackers
   """
   if(len(trackers)==0):
     return np.empty((0,2),dtype=int), np.arange(len(detections)), np.empty((0,5),dtype=int)
 
-  iou_matrix = iou_batch(detections, trackers)
-
-  if min(iou_matrix.shape) > 0:
-    a = (iou_matrix > iou_threshold).astype(np.int32)
-    if a.sum(1).max() == 1 and a.sum(0).max() == 1:
+  if gated:
+    matched_indices, matched_iou = gated_assignment(detections, trackers, iou_threshold)
+  else:
+    iou_matrix = iou_batch(detections, trackers)
+    if min(iou_matrix.shape) > 0:
+      a = iou_matrix > iou_threshold
+      if a.sum(1).max() == 1 and a.sum(0).max() == 1:
         matched_indices = np.stack(np.where(a), axis=1)
+      else:
+        matched_indices = linear_assignment(-iou_matrix)
     else:
-      matched_indices = linear_assignment(-iou_matrix)
-  else:
-    matched_indices = np.empty(shape=(0,2))
-
-  unmatched_detections = []
-  for d, det in enumerate(detections):
-    if(d not in matched_indices[:,0]):
-      unmatched_detections.append(d)
-  unmatched_trackers = []
-  for t, trk in enumerate(trackers):
-    if(t not in matched_indices[:,1]):
-      unmatched_trackers.append(t)
+      matched_indices = np.empty((0,2),dtype=int)
+    matched_indices = matched_indices.astype(int).reshape(-1, 2)
+    matched_iou = iou_matrix[matched_indices[:, 0], matched_indices[:, 1]]
 
   #filter out matched with low IOU
-  matches = []
-  for m in matched_indices:
-    if(iou_matrix[m[0], m[1]]<iou_threshold):
-      unmatched_detections.append(m[0])
-      unmatched_trackers.append(m[1])
-    else:
-      matches.append(m.reshape(1,2))
-  if(len(matches)==0):
-    matches = np.empty((0,2),dtype=int)
-  else:
-    matches = np.concatenate(matches,axis=0)
+  low = matched_iou < iou_threshold
+  matches = matched_indices[~low]
+
+  det_assigned = np.zeros(len(detections), dtype=bool)
+  det_assigned[matched_indices[:, 0]] = True
+  trk_assigned = np.zeros(len(trackers), dtype=bool)
+  trk_assigned[matched_indices[:, 1]] = True
+  unmatched_detections = np.concatenate((np.flatnonzero(~det_assigned), matched_indices[low, 0]))
+  unmatched_trackers = np.concatenate((np.flatnonzero(~trk_assigned), matched_indices[low, 1]))
 
-  return matches, np.array(unmatched_detections), np.array(unmatched_trackers)
+  return matches, unmatched_detections, unmatched_trackers
 
 
 class Sort(object):
-  def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3):
+  def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3, gated=False):
     """
     Sets key parameters for SORT
     """
     self.max_age = max_age
     self.min_hits = min_hits
     self.iou_threshold = iou_threshold
-    self.trackers = []
+    self.gated = gated
+    self.tracks = KalmanBoxTracks()
     self.frame_count = 0
 
+  def _output(self):
+    """
+    Returns [x1,y1,x2,y2,id] rows for the confirmed tracks updated this frame,
+    newest track first.
+    """
+    trks = self.tracks
+    show = (trks.time_since_update < 1) & ((trks.hit_streak >= self.min_hits) | (self.frame_count <= self.min_hits))
+    d = trks.get_state()[show]
+    valid = ~np.any(np.isnan(d), axis=1)
+    # +1 as MOT benchmark requires positive
+    return np.column_stack((d[valid], trks.id[show][valid] + 1))[::-1].reshape(-1, 5)
+
   def update(self, dets=np.empty((0, 5))):
     """
     Params:
@@ -218,113 +350,35 @@ class Sort(object):
     """
     self.frame_count += 1
     # get predicted locations from existing trackers.
-    trks = np.zeros((len(self.trackers), 5))
-    to_del = []
-    ret = []
-    for t, trk in enumerate(trks):
-      pos = self.trackers[t].predict()[0]
-      trk[:] = [pos[0], pos[1], pos[2], pos[3], 0]
-      if np.any(np.isnan(pos)):
-        to_del.append(t)
-    trks = np.ma.compress_rows(np.ma.masked_invalid(trks))
-    for t in reversed(to_del):
-      self.trackers.pop(t)
-    matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets,trks, self.iou_threshold)
+    trks = self.tracks.predict()
+    invalid = np.any(np.isnan(trks), axis=1)
+    if invalid.any():
+      self.tracks.keep(~invalid)
+      trks = trks[~invalid]
+    matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets,trks, self.iou_threshold, self.gated)
 
     # update matched trackers with assigned detections
-    for m in matched:
-      self.trackers[m[1]].update(dets[m[0], :])
+    self.tracks.update(matched[:, 1], dets[matched[:, 0], :4])
 
     # create and initialise new trackers for unmatched detections
-    for i in unmatched_dets:
-        trk = KalmanBoxTracker(dets[i,:])
-        self.trackers.append(trk)
-    i = len(self.trackers)
-    for trk in reversed(self.trackers):
-        d = trk.get_state()[0]
-        if (trk.time_since_update < 1) and (trk.hit_streak >= self.min_hits or self.frame_count <= self.min_hits):
-          ret.append(np.concatenate((d,[trk.id+1])).reshape(1,-1)) # +1 as MOT benchmark requires positive
-        i -= 1
-        # remove dead tracklet
-        if(trk.time_since_update > self.max_age):
-          self.trackers.pop(i)
-    if(len(ret)>0):
-      return np.concatenate(ret)
-    return np.empty((0,5))
-
-def parse_args():
-    """Parse input arguments."""
-    parser = argparse.ArgumentParser(description='SORT demo')
-    parser.add_argument('--display', dest='display', help='Display online tracker output (slow) [False]',action='store_true')
-    parser.add_argument("--seq_path", help="Path to detections.", type=str, default='data')
-    parser.add_argument("--phase", help="Subdirectory in seq_path.", type=str, default='train')
-    parser.add_argument("--max_age", 
-                        help="Maximum number of frames to keep alive a track without associated detections.", 
-                        type=int, default=1)
-    parser.add_argument("--min_hits", 
-                        help="Minimum number of associated detections before track is initialised.", 
-                        type=int, default=3)
-    parser.add_argument("--iou_threshold", help="Minimum IOU for match.", type=float, default=0.3)
-    args = parser.parse_args()
-    return args
+    self.tracks.add(dets[np.asarray(unmatched_dets, dtype=int), :4])
+
+    ret = self._output()
+    # remove dead tracklets
+    self.tracks.keep(self.tracks.time_since_update <= self.max_age)
+    return ret
+
+  def predict(self):
+    """
+    Advances all trackers by one frame that was not run through the detector
+    (e.g. between keyframes) and returns their predicted boxes in the same format
+    as update(). Skipped frames do not age tracks out or reset their hit streaks.
+    """
+    self.tracks.predict(missed=False)
+    return self._output()
+
 
 if __name__ == '__main__':
-  # all train
-  args = parse_args()
-  display = args.display
-  phase = args.phase
-  total_time = 0.0
-  total_frames = 0
-  colours = np.random.rand(32, 3) #used only for display
-  if(display):
-    if not os.path.exists('mot_benchmark'):
-      print('\n\tERROR: mot_benchmark link not found!\n\n    Create a symbolic link to the MOT benchmark\n    (https://motchallenge.net/data/2D_MOT_2015/#download). E.g.:\n\n    $ ln -s /path/to/MOT2015_challenge/2DMOT2015 mot_benchmark\n\n')
-      exit()
-    plt.ion()
-    fig = plt.figure()
-    ax1 = fig.add_subplot(111, aspect='equal')
-
-  if not os.path.exists('output'):
-    os.makedirs('output')
-  pattern = os.path.join(args.seq_path, phase, '*', 'det', 'det.txt')
-  for seq_dets_fn in glob.glob(pattern):
-    mot_tracker = Sort(max_age=args.max_age, 
-                       min_hits=args.min_hits,
-                       iou_threshold=args.iou_threshold) #create instance of the SORT tracker
-    seq_dets = np.loadtxt(seq_dets_fn, delimiter=',')
-    seq = seq_dets_fn[pattern.find('*'):].split(os.path.sep)[0]
-    
-    with open(os.path.join('output', '%s.txt'%(seq)),'w') as out_file:
-      print("Processing %s."%(seq))
-      for frame in range(int(seq_dets[:,0].max())):
-        frame += 1 #detection and frame numbers begin at 1
-        dets = seq_dets[seq_dets[:, 0]==frame, 2:7]
-        dets[:, 2:4] += dets[:, 0:2] #convert to [x1,y1,w,h] to [x1,y1,x2,y2]
-        total_frames += 1
-
-        if(display):
-          fn = os.path.join('mot_benchmark', phase, seq, 'img1', '%06d.jpg'%(frame))
-          im =io.imread(fn)
-          ax1.imshow(im)
-          plt.title(seq + ' Tracked Targets')
-
-        start_time = time.time()
-        trackers = mot_tracker.update(dets)
-        cycle_time = time.time() - start_time
-        total_time += cycle_time
-
-        for d in trackers:
-          print('%d,%d,%.2f,%.2f,%.2f,%.2f,1,-1,-1,-1'%(frame,d[4],d[0],d[1],d[2]-d[0],d[3]-d[1]),file=out_file)
-          if(display):
-            d = d.astype(np.int32)
-            ax1.add_patch(patches.Rectangle((d[0],d[1]),d[2]-d[0],d[3]-d[1],fill=False,lw=3,ec=colours[d[4]%32,:]))
-
-        if(display):
-          fig.canvas.flush_events()
-          plt.draw()
-          ax1.cla()
-
-  print("Total Tracking took: %.3f seconds for %d frames or %.1f FPS" % (total_time, total_frames, total_frames / total_time))
-
-  if(display):
-    print("Note: to get real runtime results run without the option: --display")
+  # The MOT demo and its display dependencies live in demo.py
+  from demo import main
+  main()
@@ -0,0 +1,401 @@
+import cv2
+import time
+import numpy as np
+from collections import defaultdict, namedtuple
+from sort.sort import Sort
+from pipeline import Stage, run_serial, run_pipelined
+from detection import PlayerDetector
+from reid_gallery import ReIDGallery
+from pitch import PitchMapper, box_centers, ball_distances
+from camera_motion import CameraMotionEstimator
+from track_state import TrackTable
+from overlay import OverlayRenderer
+from profiling import NULL_PROFILER
+
+TEAM_COLORS = {
+    0: ("Red", (0, 0, 255)),     # Team Red (B, G, R)
+    1: ("Blue", (255, 0, 0)),    # Team Blue (B, G, R)
+    2: ("Referee", (0, 0, 0))    # Referee (B, G, R)
+}
+
+# Snapshot of everything the overlay needs for one frame.
+# players is a list of (track_id, (x1, y1, x2, y2), center_pos, team_id, speed, distance, near_ball)
+# camera_motion is the (dx, dy) pixel shift of the scene since the previous frame
+FrameStats = namedtuple('FrameStats', ['frame_index', 'players', 'ball_coords', 'possession', 'camera_motion'],
+                        defaults=((0.0, 0.0),))
+
+POSSESSION_RADIUS = 50 # pixels between a player's center and the ball
+
+
+def possession_percentages(ball_possession_time):
+    """
+    Returns the ball control percentage of each team (referee excluded) from the
+    number of frames each team had a player near the ball.
+    """
+    total_control = sum(ball_possession_time.values())
+    if total_control == 0: # Avoid division by zero
+        total_control = 1e-5 # Small epsilon
+    return {tid: (ball_possession_time.get(tid, 0) / total_control) * 100
+            for tid in sorted(TEAM_COLORS.keys()) if tid != 2}
+
+
+def jersey_crop(img, x1, y1, x2, y2):
+    """
+    Crops the jersey region from a player bounding box.
+    Assumes jersey is in the upper half of the body.
+    """
+    h = int(y2 - y1)
+    # Ensure crop coordinates are within image bounds
+    crop_y1 = int(y1)
+    crop_y2 = int(y1 + 0.5 * h)
+    crop_x1 = int(x1)
+    crop_x2 = int(x2)
+
+    # Handle cases where crop goes out of bounds (shouldn't happen with valid bbox but good practice)
+    crop_y1 = max(0, crop_y1)
+    crop_y2 = min(img.shape[0], crop_y2)
+    crop_x1 = max(0, crop_x1)
+    crop_x2 = min(img.shape[1], crop_x2)
+
+    if crop_y2 <= crop_y1 or crop_x2 <= crop_x1:
+        return None # Return None if crop region is invalid
+
+    return img[crop_y1:crop_y2, crop_x1:crop_x2]
+
+
+def calculate_speed(pos1, pos2, fps):
+    """
+    Calculates speed in km/h and distance moved in meters between pitch positions
+    in meters (see PitchMapper), for single points or (N, 2) arrays at once.
+    """
+    distance_meters = np.linalg.norm(np.asarray(pos2, dtype=float) - np.asarray(pos1, dtype=float), axis=-1)
+
+    # Speed in meters per second
+    mps = distance_meters / (1/fps) # distance / time_per_frame
+
+    # Convert m/s to km/h
+    kmph = mps * 3.6
+    return kmph, distance_meters
+
+
+class MatchAnalytics:
+    """
+    Per-player team, speed/distance and ball possession state for one match.
+    SORT track IDs are mapped to player IDs; with re-identification on, a new SORT
+    track that matches a recently lost player continues that player's ID and stats.
+    Speed and distance are measured on pitch positions from a PitchMapper (calibrated
+    or the fixed pixel ratio).
+    Per-player state lives in a TrackTable; players unseen for evict_after seconds
+    (at least as long as the re-ID gallery keeps them) are evicted from it.
+    Crops are embedded and classified by TeamClassifier.classify_crops, which
+    times and counts them with the profiler.
+    update() must be called once per frame, in frame order.
+    """
+
+    def __init__(self, team_classifier, fps, reid=True, reid_max_age=5.0, embedding_cache=None, pitch=None,
+                 evict_after=10.0, profiler=NULL_PROFILER):
+        self.team_classifier = team_classifier
+        self.profiler = profiler
+        self.pitch = pitch or PitchMapper()
+        self.embedding_cache = embedding_cache # Optional EmbeddingCache of an earlier run
+        self.fps = fps
+        self.ball_possession_time = defaultdict(int) # Tracks possession time per team
+        self.frame_index = 0
+        self.aliases = {}      # SORT track_id -> player ID
+        self.active = set()    # player IDs seen in the previous frame
+        self.reidentified = 0
+        # Lost players are kept for reid_max_age seconds
+        self.gallery = ReIDGallery(max_age=int(reid_max_age * max(fps, 1))) if reid else None
+        evict_frames = int(evict_after * max(fps, 1))
+        if self.gallery is not None:
+            evict_frames = max(evict_frames, self.gallery.max_age + 1)
+        self.players = TrackTable(evict_after=evict_frames)
+        self._recent_tracks = set() # SORT track IDs seen since the last alias pruning
+
+    def _reidentify(self, track_id, player_id):
+        """
+        Continues a lost player's ID on a new SORT track.
+        """
+        self.aliases[track_id] = player_id
+        # Restart speed from the new position instead of spanning the occlusion gap
+        self.players.reset_position(player_id)
+        self.reidentified += 1
+
+    def _embed_and_classify(self, frame, boxes):
+        """
+        CLIP embeddings and teams for the boxes of new tracks, read from the embedding
+        cache where an earlier run saw the same frame and box, computed in one batch otherwise.
+        """
+        boxes = boxes.astype(int)
+        cache = self.embedding_cache
+        if cache is None:
+            crops = [jersey_crop(frame, *box) for box in boxes]
+            return self.team_classifier.classify_crops(crops, self.profiler)
+
+        embeddings, team_ids, valid = cache.get(self.frame_index, boxes)
+        miss = np.flatnonzero(~valid)
+        if len(miss):
+            crops = [jersey_crop(frame, *boxes[i]) for i in miss]
+            emb, teams, ok = self.team_classifier.classify_crops(crops, self.profiler)
+            if embeddings.shape[1] != emb.shape[1]: # nothing cached yet
+                embeddings = np.zeros((len(boxes), emb.shape[1]), dtype=np.float32)
+            embeddings[miss], team_ids[miss], valid[miss] = emb, teams, ok
+            cache.put(self.frame_index, boxes[miss][ok], emb[ok], teams[ok])
+        return embeddings, team_ids, valid
+
+    def _resolve_new_tracks(self, frame, new_tracks):
+        """
+        Gives each new SORT track a player ID: a lost player's (IoU match first, then an
+        appearance match against the re-ID gallery) or a fresh one. All crops that need
+        CLIP are embedded and classified in one batch.
+        """
+        boxes = np.array([t[:4] for t in new_tracks], dtype=float)
+        pending = list(range(len(new_tracks)))
+
+        # Cheap case: the track reappeared where it was lost, no embedding needed
+        if self.gallery is not None and len(self.gallery):
+            matched = self.gallery.match_iou(boxes, self.frame_index)
+            for i in np.flatnonzero(matched >= 0):
+                self._reidentify(new_tracks[i][4], int(matched[i]))
+            pending = [i for i in pending if matched[i] < 0]
+        if not pending:
+            return
+
+        embeddings, team_ids, valid = self._embed_and_classify(frame, boxes[pending])
+        matched = np.full(len(pending), -1, dtype=int)
+        if self.gallery is not None and len(self.gallery) and valid.any():
+            matched[valid] = self.gallery.match(embeddings[valid], boxes[pending][valid],
+                                                self.frame_index, team_ids[valid])
+
+        for i, emb, team_id, ok, player_id in zip(pending, embeddings, team_ids, valid, matched):
+            x1, y1, x2, y2, track_id = new_tracks[i]
+            if not ok:
+                # If embedding could not be generated, skip this track for now
+                continue
+            if player_id >= 0:
+                self._reidentify(track_id, int(player_id))
+                continue
+            self.aliases[track_id] = track_id
+            self.players.add(track_id, int(team_id), emb, (x1, y1, x2, y2), self.frame_index)
+
+    def update(self, frame, tracks, ball_coords, camera_motion=(0.0, 0.0), camera_offset=(0.0, 0.0)):
+        """
+        Updates the match state with the SORT tracks of the next frame.
+        camera_offset is the scene shift accumulated by camera pans (see
+        CameraMotionEstimator); it is taken out of the positions used for speed
+        and distance so that panning does not count as running.
+        Returns a FrameStats snapshot for rendering.
+        """
+        self.frame_index += 1
+        if self.gallery is not None:
+            self.gallery.evict(self.frame_index)
+        evicted = set(self.players.evict(self.frame_index))
+        if evicted:
+            self.aliases = {t: p for t, p in self.aliases.items() if p not in evicted}
+
+        tracks = [tuple(map(int, t)) for t in tracks]
+        self._recent_tracks.update(t[4] for t in tracks)
+        if self.frame_index % self.players.evict_after == 0:
+            # SORT never revives a dead track ID, so aliases of tracks unseen for a whole period can go
+            self.aliases = {t: p for t, p in self.aliases.items() if t in self._recent_tracks}
+            self._recent_tracks = set(t[4] for t in tracks)
+        new_tracks = [t for t in tracks if t[4] not in self.aliases]
+        if new_tracks:
+            self._resolve_new_tracks(frame, new_tracks)
+
+        # Resolve player IDs first, then update the whole frame at once
+        player_ids = []
+        boxes = []
+        seen = set()
+        for x1, y1, x2, y2, sort_id in tracks:
+            track_id = self.aliases.get(sort_id)
+            if track_id is None:
+                # Team could not be classified for this track yet
+                continue
+            if track_id in seen:
+                # Old track of a re-identified player resurfaced next to its new one
+                continue
+            seen.add(track_id)
+            player_ids.append(track_id)
+            boxes.append((x1, y1, x2, y2))
+
+        table = self.players
+        slots = table.slots_of(player_ids)
+        boxes = np.array(boxes, dtype=int).reshape(-1, 4)
+        centers = box_centers(boxes)
+        positions = self.pitch.locate(boxes, camera_offset)
+        prev, moved = table.previous_positions(slots, positions)
+        speeds, dists = calculate_speed(prev, positions, self.fps)
+        table.update(slots, boxes, positions, speeds, dists, moved, self.frame_index)
+
+        # Ball control tracking: players within the radius of the ball
+        near = ball_distances(centers, ball_coords) < POSSESSION_RADIUS
+        team_ids = table.rows['team_id'][slots]
+        for team_id in team_ids[near].tolist():
+            self.ball_possession_time[team_id] += 1
+
+        rows = table.rows[slots]
+        players = [(track_id, tuple(box), tuple(center), team_id, speed, dist, near_ball)
+                   for track_id, box, center, team_id, speed, dist, near_ball in
+                   zip(player_ids, boxes.tolist(), centers.tolist(), team_ids.tolist(),
+                       rows['speed'].tolist(), rows['distance'].tolist(), near.tolist())]
+
+        if self.gallery is not None:
+            # Players that disappeared this frame become re-ID candidates
+            for player_id in self.active - seen:
+                i = table.slots[player_id]
+                row = table.rows[i]
+                self.gallery.add(player_id, table.embeddings[i], row['box'], self.frame_index, int(row['team_id']))
+            # Players whose own track came back are no longer lost
+            for player_id in seen - self.active:
+                self.gallery.remove(player_id)
+        self.active = seen
+
+        return FrameStats(self.frame_index, players, ball_coords, self.possession_percentages(),
+                          tuple(float(v) for v in camera_motion))
+
+    def possession_percentages(self):
+        """
+        Returns the ball control percentage of each team (referee excluded).
+        """
+        return possession_percentages(self.ball_possession_time)
+
+    def summary(self):
+        """
+        Returns the end-of-match stats as a JSON-serialisable dict.
+        """
+        players = {}
+        for record in self.players.records():
+            players[str(record['player_id'])] = {
+                'team': TEAM_COLORS.get(int(record['team_id']), ("Unknown",))[0],
+                'distance_m': round(float(record['distance']), 2),
+                'last_speed_kmph': round(float(record['speed']), 2),
+                'last_seen': int(record['last_seen']),
+            }
+        possession = {TEAM_COLORS[tid][0]: round(p, 2) for tid, p in self.possession_percentages().items()}
+        summary = {'frames': self.frame_index, 'fps': self.fps, 'possession_percent': possession,
+                   'reidentified': self.reidentified, 'pitch_calibrated': self.pitch.calibrated,
+                   'players': players}
+        if self.embedding_cache is not None:
+            summary['embedding_cache'] = {'hits': self.embedding_cache.hits, 'misses': self.embedding_cache.misses}
+        return summary
+
+
+def analyze_video(cap, model, team_classifier, out=None, sink=None, serial=False, queue_size=4,
+                  batch_size=1, detect_every=1, reid=True, embedding_cache=None, stats_writer=None,
+                  pitch=None, camera_motion=True, profiler=NULL_PROFILER, drop_stale=False):
+    """
+    Runs detection, tracking, stats and (if out is a VideoWriter) overlay rendering
+    over every frame of an opened capture, with a fresh SORT tracker.
+    Frames flow through the stages in batches of batch_size, and the keyframes of a
+    batch go through the detector in one inference call. With detect_every=k only every
+    k-th frame is detected and SORT's Kalman prediction carries the frames in between
+    (no ball position is known on those frames). reid turns on the re-identification
+    of players lost by SORT. embedding_cache (an EmbeddingCache) reuses the CLIP
+    results of earlier runs over the same video and is flushed at the end.
+    stats_writer (a TrackStatsWriter) receives every frame's track records and is
+    closed at the end. pitch (a PitchMapper) maps players to pitch metres for speed
+    and distance; without it the fixed pixel ratio is used. camera_motion estimates
+    the camera pan on every frame and takes it out of the player movement.
+    sink(item) is called with each finished frame and may return False to stop early;
+    item['captured'] is the perf_counter() time the frame was decoded at.
+    drop_stale (live sources) drops the oldest batch waiting between two pipelined
+    stages instead of blocking, see run_pipelined.
+    profiler (a profiling.Profiler) records the stage and step latencies, queue
+    depths, CLIP calls and the number of live SORT tracks.
+    Returns the MatchAnalytics state and the throughput report (with the overlay
+    render times when out is given).
+    """
+    fps = int(cap.get(cv2.CAP_PROP_FPS)) or 25 # live sources may not report one
+    detector = PlayerDetector(model, profiler=profiler)
+    tracker = Sort() # Initialize SORT tracker
+    camera = CameraMotionEstimator() if camera_motion else None
+    analytics = MatchAnalytics(team_classifier, fps, reid=reid, embedding_cache=embedding_cache, pitch=pitch,
+                               profiler=profiler)
+    renderer = OverlayRenderer(TEAM_COLORS) if out is not None else None
+
+    def read_frames():
+        index = 0
+        batch = []
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            # Live captures stamp frames when decoded, files when read
+            captured = getattr(cap, 'frame_time', None) or time.perf_counter()
+            batch.append({'frame': frame, 'keyframe': index % detect_every == 0, 'captured': captured})
+            index += 1
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def detect_stage(batch):
+        # Perform object detection on all keyframes of the batch at once
+        keyframes = [item for item in batch if item['keyframe']]
+        for item, (dets, ball) in zip(keyframes, detector.detect_batch([item['frame'] for item in keyframes])):
+            item['dets'], item['ball'] = dets, ball
+        return batch
+
+    def camera_stage(batch):
+        # Estimate the camera pan, strictly in frame order
+        for item in batch:
+            dets = item.get('dets')
+            item['camera_motion'] = camera.update(item['frame'], dets[:, :4] if dets is not None and len(dets) else None)
+            item['camera_offset'] = camera.offset.copy()
+        return batch
+
+    def track_stage(batch):
+        # Update SORT tracker and player stats, strictly in frame order
+        for item in batch:
+            with profiler.time('sort'):
+                if item['keyframe']:
+                    tracks = tracker.update(item['dets'])
+                else:
+                    tracks = tracker.predict()
+                    item['ball'] = None
+            profiler.gauge('active_tracks', len(tracker.tracks))
+            item['stats'] = analytics.update(item['frame'], tracks, item['ball'],
+                                             item.get('camera_motion', (0.0, 0.0)),
+                                             item.get('camera_offset', (0.0, 0.0)))
+            if stats_writer is not None:
+                stats_writer.write(item['stats'])
+        return batch
+
+    def render_stage(batch):
+        # Draw the overlay and write the processed frames to the output video
+        for item in batch:
+            with profiler.time('draw'):
+                renderer.render(item['frame'], item['stats'])
+            with profiler.time('encode'):
+                out.write(item['frame'])
+        return batch
+
+    def frame_sink(batch):
+        for item in batch:
+            if sink(item) is False:
+                return False
+        return True
+
+    stages = [Stage('detect', detect_stage, profiler)]
+    if camera is not None:
+        stages.append(Stage('camera', camera_stage, profiler))
+    stages.append(Stage('track', track_stage, profiler))
+    if out is not None:
+        stages.append(Stage('render', render_stage, profiler))
+
+    try:
+        if serial:
+            report = run_serial(read_frames(), stages, frame_sink if sink else None, profiler=profiler)
+        else:
+            report = run_pipelined(read_frames(), stages, frame_sink if sink else None, queue_size=queue_size,
+                                   profiler=profiler, drop_stale=drop_stale)
+    finally:
+        if embedding_cache is not None:
+            embedding_cache.close()
+        if stats_writer is not None:
+            stats_writer.close()
+    if renderer is not None:
+        report += "\n" + renderer.report()
+    return analytics, report
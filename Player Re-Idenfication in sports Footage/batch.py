@@ -0,0 +1,230 @@
+"""
+Headless batch mode: shards a directory or manifest of match videos across a
+process pool. Each worker loads its own YOLO and CLIP models once and gets a
+fresh SORT tracker per video, then writes an annotated MP4 and a stats JSON
+to the results directory.
+
+    python batch.py videos/ --workers 4
+    python batch.py matchday.txt --results results/matchday
+"""
+import os
+import cv2
+import json
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+# Per-process models, loaded once by the pool initializer
+_model = None
+_team_classifier = None
+
+
+def list_videos(source):
+    """
+    Returns the video paths of a directory, or of a manifest file with one path per line.
+    Relative manifest paths are resolved against the manifest's directory.
+    """
+    if os.path.isdir(source):
+        return sorted(p for p in glob.glob(os.path.join(source, '*')) if p.lower().endswith(VIDEO_EXTENSIONS))
+    base = os.path.dirname(os.path.abspath(source))
+    videos = []
+    with open(source) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            videos.append(line if os.path.isabs(line) else os.path.join(base, line))
+    return videos
+
+
+def output_names(videos):
+    """
+    Returns a unique output name per video: its path relative to the videos'
+    common directory, without extension, with directories joined by '__'
+    (a/match.mp4 -> a__match). Raises ValueError when two videos map to the same name.
+    """
+    if not videos:
+        return []
+    paths = [os.path.abspath(v) for v in videos]
+    root = os.path.commonpath([os.path.dirname(p) for p in paths])
+    names = [os.path.splitext(os.path.relpath(p, root))[0].replace(os.sep, '__') for p in paths]
+    seen = {}
+    for video, name in zip(videos, names):
+        if name in seen:
+            raise ValueError(f"{seen[name]} and {video} would both write {name}_* outputs")
+        seen[name] = video
+    return names
+
+
+def init_worker(model_path, torch_threads):
+    """
+    Loads the detector and CLIP classifier once per worker process.
+    """
+    global _model, _team_classifier
+    import torch
+    from ultralytics import YOLO
+    from team_classifier import TeamClassifier
+
+    torch.set_num_threads(torch_threads)
+    cv2.setNumThreads(1)
+    _model = YOLO(model_path)
+    _team_classifier = TeamClassifier()
+
+
+def process_video(video_path, results_dir, serial=False, batch_size=1, detect_every=1, reid=True,
+                  cache_dir=None, analytics_only=False, pitch_calibration=None, camera_motion=True, name=None):
+    """
+    Processes one clip in a worker and writes <name>_overlay.mp4, <name>_stats.json
+    (with the per-stage profile) and the per-frame track records <name>_tracks.parquet
+    (or _tracks_npz without pyarrow).
+    With analytics_only no overlay video is drawn or encoded. pitch_calibration is
+    an optional calibration file for PitchMapper, shared by all clips of one camera.
+    name defaults to the file name without extension; batches pass output_names().
+    Returns a short result record for the aggregate summary.
+    """
+    from analytics import analyze_video
+    from embedding_cache import EmbeddingCache, CacheLockedError
+    from stats_writer import TrackStatsWriter, default_stats_path
+    from pitch import PitchMapper
+    from profiling import Profiler
+
+    name = name or os.path.splitext(os.path.basename(video_path))[0]
+    record = {'video': video_path, 'status': 'ok'}
+    start = time.perf_counter()
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        record.update(status='error', error='could not open video file')
+        return record
+
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = int(cap.get(cv2.CAP_PROP_FPS)) or 25 # some containers do not report one
+    video_out = None
+    out = None
+    if not analytics_only:
+        video_out = os.path.join(results_dir, f"{name}_overlay.mp4")
+        out = cv2.VideoWriter(video_out, cv2.VideoWriter_fourcc(*'mp4v'), fps, (frame_width, frame_height))
+    try:
+        cache = None
+        if cache_dir:
+            try:
+                cache = EmbeddingCache(cache_dir, video_path, tag=_team_classifier.tag)
+            except CacheLockedError:
+                # The same clip is listed twice and another worker holds its cache
+                record['embedding_cache'] = 'in use, skipped'
+        pitch = PitchMapper.load(pitch_calibration) if pitch_calibration else None
+        profiler = Profiler(log_every=0)
+        tracks_out = default_stats_path(os.path.join(results_dir, f"{name}_tracks"))
+        analytics, report = analyze_video(cap, _model, _team_classifier, out, serial=serial,
+                                          batch_size=batch_size, detect_every=detect_every, reid=reid,
+                                          embedding_cache=cache, stats_writer=TrackStatsWriter(tracks_out),
+                                          pitch=pitch, camera_motion=camera_motion, profiler=profiler)
+    except Exception as e:
+        record.update(status='error', error=repr(e))
+        return record
+    finally:
+        cap.release()
+        if out is not None:
+            out.release()
+
+    elapsed = time.perf_counter() - start
+    stats = analytics.summary()
+    stats.update(video=video_path, processing_seconds=round(elapsed, 2), throughput=report,
+                 profile=profiler.summary())
+    stats_out = os.path.join(results_dir, f"{name}_stats.json")
+    with open(stats_out, 'w') as f:
+        json.dump(stats, f, indent=2)
+
+    record.update(frames=stats['frames'], seconds=round(elapsed, 2),
+                  fps=round(stats['frames'] / elapsed, 2) if elapsed > 0 else 0.0,
+                  players=len(stats['players']), possession_percent=stats['possession_percent'],
+                  overlay=video_out, stats=stats_out, tracks=tracks_out)
+    return record
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(description='Headless batch player re-identification')
+    parser.add_argument('source', help='Directory of videos or manifest file with one video path per line')
+    parser.add_argument('--results', default='results', help='Output directory [results]')
+    parser.add_argument('--model', default='models/yolo_players.pt', help='YOLO weights')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes [all cores]')
+    parser.add_argument('--torch-threads', type=int, default=None,
+                        help='Torch threads per worker [cores / workers]')
+    parser.add_argument('--serial', action='store_true', help='Run the stages of each video on one thread')
+    parser.add_argument('--batch-size', type=int, default=1, help='Frames per YOLO inference call [1]')
+    parser.add_argument('--detect-every', type=int, default=1,
+                        help='Run the detector on every k-th frame only; SORT predicts the frames in between [1]')
+    parser.add_argument('--no-reid', action='store_true', help='Do not re-identify players lost by the tracker')
+    parser.add_argument('--analytics-only', action='store_true',
+                        help='Only write stats: no overlay video (replay later with render_stats.py)')
+    parser.add_argument('--embedding-cache', default='embedding_cache',
+                        help="Directory of cached CLIP embeddings reused across runs ('' to disable) [embedding_cache]")
+    parser.add_argument('--pitch-calibration', default=None,
+                        help='JSON homography or image/pitch point pairs for speed and distance in real meters')
+    parser.add_argument('--no-camera-motion', action='store_true',
+                        help='Do not estimate camera pans (speed and distance then include camera motion)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    videos = list_videos(args.source)
+    if not videos:
+        print(f"No videos found in {args.source}.")
+        return
+    try:
+        names = output_names(videos)
+    except ValueError as e:
+        print(f"Duplicate output names: {e}")
+        return
+    os.makedirs(args.results, exist_ok=True)
+
+    workers = max(1, min(args.workers, len(videos)))
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // workers)
+    print(f"Processing {len(videos)} videos on {workers} workers ({torch_threads} torch threads each)...")
+
+    start = time.perf_counter()
+    records = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(args.model, torch_threads)) as pool:
+        futures = {pool.submit(process_video, v, args.results, args.serial,
+                               args.batch_size, args.detect_every, not args.no_reid,
+                               args.embedding_cache, args.analytics_only,
+                               args.pitch_calibration, not args.no_camera_motion, name): v
+                   for v, name in zip(videos, names)}
+        for future in as_completed(futures):
+            try:
+                record = future.result()
+            except Exception as e: # worker crashed
+                record = {'video': futures[future], 'status': 'error', 'error': repr(e)}
+            records.append(record)
+            if record['status'] == 'ok':
+                print(f"  done  {record['video']}: {record['frames']} frames in {record['seconds']}s ({record['fps']} FPS)")
+            else:
+                print(f"  FAILED {record['video']}: {record['error']}")
+
+    elapsed = time.perf_counter() - start
+    ok = [r for r in records if r['status'] == 'ok']
+    total_frames = sum(r['frames'] for r in ok)
+    summary = {
+        'videos': len(videos),
+        'succeeded': len(ok),
+        'failed': len(records) - len(ok),
+        'total_frames': total_frames,
+        'wall_seconds': round(elapsed, 2),
+        'aggregate_fps': round(total_frames / elapsed, 2) if elapsed > 0 else 0.0,
+        'workers': workers,
+        'results': sorted(records, key=lambda r: r['video']),
+    }
+    with open(os.path.join(args.results, 'batch_summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"Batch complete: {len(ok)}/{len(videos)} videos, {total_frames} frames in {elapsed:.1f}s "
+          f"({summary['aggregate_fps']} FPS aggregate). Summary written to {args.results}/batch_summary.json")
+
+
+if __name__ == '__main__':
+    main()
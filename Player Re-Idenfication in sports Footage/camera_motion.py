@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+
+
+class CameraMotionEstimator:
+    """
+    Global camera motion between consecutive frames from sparse optical flow.
+    Background corners are tracked with pyramidal Lucas-Kanade on a downscaled
+    grayscale frame and reused from frame to frame; new corners are only detected
+    (outside the player boxes) when too few survive. A RANSAC similarity fit
+    rejects points on moving players, and its displacement of the frame center is
+    taken as the camera pan in full-resolution pixels.
+    update() must be called once per frame, in frame order.
+    """
+
+    def __init__(self, scale=0.25, max_corners=200, min_corners=60, quality_level=0.01,
+                 min_distance=8, ransac_threshold=1.0):
+        self.scale = scale
+        self.max_corners = max_corners
+        self.min_corners = min_corners         # re-detect corners below this many tracked points
+        self.quality_level = quality_level
+        self.min_distance = min_distance       # pixels between corners, in the downscaled frame
+        self.ransac_threshold = ransac_threshold
+        self.prev_gray = None
+        self.points = None
+        self.offset = np.zeros(2)              # accumulated scene shift since the first frame
+
+    def _gray(self, frame):
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def _detect(self, gray, boxes):
+        mask = np.full(gray.shape, 255, dtype=np.uint8)
+        if boxes is not None:
+            # Keep corners off the players, they move on their own
+            for x1, y1, x2, y2 in (np.asarray(boxes, dtype=float).reshape(-1, 4) * self.scale).astype(int):
+                mask[max(y1, 0):max(y2, 0), max(x1, 0):max(x2, 0)] = 0
+        points = cv2.goodFeaturesToTrack(gray, self.max_corners, self.quality_level, self.min_distance, mask=mask)
+        return points if points is not None else np.empty((0, 1, 2), dtype=np.float32)
+
+    def update(self, frame, boxes=None):
+        """
+        Estimates the camera motion from the previous frame to this one.
+        boxes (N, 4) are the player boxes to keep new corners away from, if known.
+        Returns the (dx, dy) shift of the scene in full-resolution pixels.
+        """
+        gray = self._gray(frame)
+        motion = np.zeros(2)
+        if self.prev_gray is not None and len(self.points):
+            moved, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, self.points, None,
+                                                        winSize=(15, 15), maxLevel=2)
+            ok = status.ravel() == 1
+            p0, p1 = self.points[ok].reshape(-1, 2), moved[ok].reshape(-1, 2)
+            if len(p0) >= 3:
+                M, inliers = cv2.estimateAffinePartial2D(p0, p1, method=cv2.RANSAC,
+                                                         ransacReprojThreshold=self.ransac_threshold)
+                if M is not None:
+                    center = np.array([gray.shape[1] / 2, gray.shape[0] / 2])
+                    motion = (M[:, :2] @ center + M[:, 2] - center) / self.scale
+                    p1 = p1[inliers.ravel() == 1]
+            self.points = p1.reshape(-1, 1, 2).astype(np.float32)
+        if self.points is None or len(self.points) < self.min_corners:
+            self.points = self._detect(gray, boxes)
+        self.prev_gray = gray
+        self.offset += motion
+        return motion
@@ -0,0 +1,334 @@
+"""
+Re-ID training set storage: labelled player crops in sharded, append-only
+container files with an index, instead of one JPEG per crop.
+
+Crops are resized to a fixed size and stored raw, so a shard memory-maps as one
+(N, H, W, 3) uint8 array and training or gallery building reads crops without
+decoding or copying. Near-duplicate crops of the same label in the same video
+(consecutive frames of a standing player) are dropped on the way in by a 64-bit
+difference hash.
+
+    python dataset_builder.py import players_dataset players_shards   # convert a <label>_f<frame>.jpg folder
+    python dataset_builder.py stats players_shards
+"""
+import os
+import re
+import json
+import glob
+import argparse
+import cv2
+import numpy as np
+
+CROP_SIZE = (64, 128) # stored crop width, height (the usual 1:2 re-ID input)
+SHARD_SIZE = 4096     # crops per shard file (~100 MB at the default crop size)
+DEDUPE_WINDOW = 64    # latest crops of a label in a video that a new crop is compared with
+
+# One index record per stored crop
+INDEX_DTYPE = np.dtype([
+    ('shard', np.int32),
+    ('row', np.int32),        # crop number within the shard
+    ('label', 'S16'),
+    ('video', np.int32),      # line of videos.txt, -1 if unknown
+    ('frame', np.int64),      # -1 if unknown
+    ('bbox', np.int32, 4),    # x1, y1, x2, y2 in the source frame
+    ('dhash', np.uint64),
+])
+
+
+def dhash(image, size=8):
+    """
+    64-bit difference hash of an image: the sign of the horizontal gradient of
+    its grayscale thumbnail. Near-identical crops differ in only a few bits.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    thumb = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (thumb[:, 1:] > thumb[:, :-1]).ravel()
+    return np.uint64(int.from_bytes(np.packbits(bits).tobytes(), 'big'))
+
+
+def hamming(hashes, h):
+    """
+    Bit distances between an array of hashes and one hash.
+    """
+    diff = hashes ^ np.uint64(h)
+    if hasattr(np, 'bitwise_count'): # NumPy >= 2.0
+        return np.bitwise_count(diff)
+    return np.unpackbits(diff.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+
+def _shard_path(root, shard):
+    return os.path.join(root, f"shard_{shard:05d}.u8")
+
+
+def _read_layout(root):
+    with open(os.path.join(root, 'meta.json')) as f:
+        meta = json.load(f)
+    videos = []
+    videos_path = os.path.join(root, 'videos.txt')
+    if os.path.exists(videos_path):
+        with open(videos_path) as f:
+            videos = f.read().splitlines()
+    return meta, videos
+
+
+def _read_index(root, crop_bytes):
+    """
+    Index records whose crops are fully on disk; a tail torn by an interrupted
+    write (index or shard) is left out.
+    """
+    index_path = os.path.join(root, 'index.bin')
+    if not os.path.exists(index_path):
+        return np.empty(0, dtype=INDEX_DTYPE)
+    index = np.fromfile(index_path, dtype=np.uint8)
+    index = index[:len(index) // INDEX_DTYPE.itemsize * INDEX_DTYPE.itemsize].view(INDEX_DTYPE)
+    keep = np.ones(len(index), dtype=bool)
+    for shard in np.unique(index['shard']).tolist():
+        path = _shard_path(root, shard)
+        rows = os.path.getsize(path) // crop_bytes if os.path.exists(path) else 0
+        in_shard = index['shard'] == shard
+        keep[in_shard & (index['row'] >= rows)] = False
+    return index[keep]
+
+
+class DatasetWriter:
+    """
+    Appends labelled crops to a dataset directory, creating it if needed.
+
+    Layout of <root>/ (all data files are append-only):
+      meta.json        crop size and shard size
+      videos.txt       source video paths, one per line; the index refers to them by line
+      index.bin        INDEX_DTYPE records, one per crop
+      shard_NNNNN.u8   crops as raw (H, W, 3) uint8, shard_size per file
+
+    A crop whose hash is within dedupe_distance bits of one of the last
+    dedupe_window crops with the same label from the same video is skipped
+    (dedupe_distance=None keeps everything), so the check costs the same however
+    large the dataset grows, and labels reused across videos do not collide. Crops are
+    buffered and appended flush_every at a time, shard data before the index,
+    so the index never points past the data.
+    """
+
+    def __init__(self, root, crop_size=CROP_SIZE, shard_size=SHARD_SIZE, dedupe_distance=4,
+                 dedupe_window=DEDUPE_WINDOW, flush_every=256):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        meta_path = os.path.join(root, 'meta.json')
+        if os.path.exists(meta_path):
+            meta, self.videos = _read_layout(root) # an existing dataset keeps its layout
+            crop_size, shard_size = tuple(meta['crop_size']), meta['shard_size']
+        else:
+            self.videos = []
+            with open(meta_path, 'w') as f:
+                json.dump({'crop_size': list(crop_size), 'shard_size': shard_size}, f)
+        self.crop_size = crop_size
+        self.shard_size = shard_size
+        self.crop_bytes = crop_size[0] * crop_size[1] * 3
+        self.dedupe_distance = dedupe_distance
+        self.dedupe_window = dedupe_window
+        self.flush_every = flush_every
+        self.written = 0
+        self.duplicates = 0
+        self._video_ids = {path: i for i, path in enumerate(self.videos)}
+
+        index = _read_index(root, self.crop_bytes)
+        self._repair(index)
+        self.size = len(index)
+        self._hashes = {}  # (video ID, label) -> (ring buffer of the latest hashes, count ever added)
+        for video_id, label in np.unique(index[['video', 'label']]).tolist():
+            hashes = index['dhash'][(index['video'] == video_id) & (index['label'] == label)]
+            for h in hashes[-dedupe_window:]:
+                self._remember((video_id, label), h)
+        self._pending_index = []
+        self._pending_crops = []
+
+    def _repair(self, index):
+        # Cut every file back to what the index covers, so appends continue cleanly
+        with open(os.path.join(self.root, 'index.bin'), 'ab') as f:
+            f.truncate(len(index) * INDEX_DTYPE.itemsize)
+        last_shard, rows = (int(index['shard'][-1]), int(index['row'][-1]) + 1) if len(index) else (0, 0)
+        for path in glob.glob(os.path.join(self.root, 'shard_*.u8')):
+            shard = int(re.search(r'shard_(\d+)', path).group(1))
+            if shard > last_shard:
+                os.remove(path)
+            elif shard == last_shard:
+                with open(path, 'r+b') as f:
+                    f.truncate(rows * self.crop_bytes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.size + len(self._pending_index)
+
+    def _video_id(self, video):
+        if video is None:
+            return -1
+        video_id = self._video_ids.get(video)
+        if video_id is None:
+            video_id = self._video_ids[video] = len(self.videos)
+            self.videos.append(video)
+            with open(os.path.join(self.root, 'videos.txt'), 'a') as f:
+                f.write(video + '\n')
+        return video_id
+
+    def _remember(self, key, h):
+        hashes, n = self._hashes.get(key) or (np.empty(self.dedupe_window, dtype=np.uint64), 0)
+        hashes[n % len(hashes)] = h
+        self._hashes[key] = (hashes, n + 1)
+
+    def _is_duplicate(self, key, h):
+        """
+        Checks the hash against the latest crops of the (video ID, label) key and records it if new.
+        """
+        hashes, n = self._hashes.get(key, (None, 0))
+        if self.dedupe_distance is not None and n and \
+                hamming(hashes[:min(n, len(hashes))], h).min() <= self.dedupe_distance:
+            return True
+        self._remember(key, h)
+        return False
+
+    def add(self, crop, label, frame=-1, bbox=(0, 0, 0, 0), video=None):
+        """
+        Adds one BGR crop. Returns False if it was dropped as a near-duplicate.
+        """
+        crop = cv2.resize(crop, self.crop_size, interpolation=cv2.INTER_AREA)
+        label = label.encode()[:INDEX_DTYPE['label'].itemsize]
+        h = dhash(crop)
+        video_id = self._video_id(video)
+        if self._is_duplicate((video_id, label), h):
+            self.duplicates += 1
+            return False
+        n = len(self)
+        self._pending_index.append((n // self.shard_size, n % self.shard_size, label, video_id,
+                                    frame, tuple(int(v) for v in bbox[:4]), h))
+        self._pending_crops.append(crop)
+        self.written += 1
+        if len(self._pending_crops) >= self.flush_every:
+            self.flush()
+        return True
+
+    def flush(self):
+        """
+        Appends the pending crops to their shards, then their index records.
+        """
+        if not self._pending_crops:
+            return
+        index = np.array(self._pending_index, dtype=INDEX_DTYPE)
+        crops = np.stack(self._pending_crops)
+        for shard in np.unique(index['shard']).tolist():
+            with open(_shard_path(self.root, shard), 'ab') as f:
+                crops[index['shard'] == shard].tofile(f)
+        with open(os.path.join(self.root, 'index.bin'), 'ab') as f:
+            index.tofile(f)
+        self.size += len(index)
+        self._pending_index = []
+        self._pending_crops = []
+
+    def close(self):
+        self.flush()
+
+
+class CropDataset:
+    """
+    Read-only view of a dataset directory written by DatasetWriter.
+    Every shard is memory-mapped as an (N, H, W, 3) uint8 array, so dataset[i]
+    returns a crop without reading or copying the rest; index holds the
+    INDEX_DTYPE record of every crop, in insertion order.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        meta, self.videos = _read_layout(root)
+        self.crop_size = tuple(meta['crop_size'])
+        width, height = self.crop_size
+        self.index = _read_index(root, width * height * 3)
+        self.shards = {}
+        for shard in np.unique(self.index['shard']).tolist():
+            rows = int(self.index['row'][self.index['shard'] == shard].max()) + 1
+            self.shards[shard] = np.memmap(_shard_path(root, shard), dtype=np.uint8, mode='r',
+                                           shape=(rows, height, width, 3))
+        self.label_names, self.label_ids = np.unique(self.index['label'], return_inverse=True)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        record = self.index[i]
+        return self.shards[int(record['shard'])][int(record['row'])]
+
+    @property
+    def labels(self):
+        """
+        Label strings, indexed by the values of label_ids.
+        """
+        return [label.decode() for label in self.label_names.tolist()]
+
+    def indices_of(self, label):
+        """
+        Positions of all crops with a label.
+        """
+        return np.flatnonzero(self.index['label'] == label.encode())
+
+    def batch(self, indices):
+        """
+        Crops at the given positions as one (N, H, W, 3) array, one gather per shard.
+        """
+        indices = np.asarray(indices, dtype=int)
+        width, height = self.crop_size
+        out = np.empty((len(indices), height, width, 3), dtype=np.uint8)
+        records = self.index[indices]
+        for shard in np.unique(records['shard']).tolist():
+            mask = records['shard'] == shard
+            out[mask] = self.shards[shard][records['row'][mask]]
+        return out
+
+
+def import_folder(folder, root, **writer_args):
+    """
+    Adds every <label>_f<frame>.jpg of a flat crop folder (the old img.py output).
+    Returns the writer, for its written / duplicates counts.
+    """
+    pattern = re.compile(r'(.+)_f(\d+)\.jpg$')
+    files = []
+    for path in glob.glob(os.path.join(folder, '*.jpg')):
+        match = pattern.match(os.path.basename(path))
+        if match is not None:
+            files.append((int(match.group(2)), match.group(1), path))
+    with DatasetWriter(root, **writer_args) as writer:
+        # In frame order, so consecutive near-duplicates meet in the hash check
+        for frame, label, path in sorted(files):
+            crop = cv2.imread(path)
+            if crop is not None:
+                writer.add(crop, label, frame=frame)
+    return writer
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(description='Sharded re-ID crop dataset')
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help='Convert a folder of <label>_f<frame>.jpg crops')
+    imp.add_argument('folder')
+    imp.add_argument('root')
+    imp.add_argument('--dedupe-distance', type=int, default=4,
+                     help='Max differing hash bits for a near-duplicate (-1 keeps all) [4]')
+    stats = sub.add_parser('stats', help='Crops per label of a dataset')
+    stats.add_argument('root')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.command == 'import':
+        writer = import_folder(args.folder, args.root,
+                               dedupe_distance=None if args.dedupe_distance < 0 else args.dedupe_distance)
+        print(f"Stored {writer.written} crops, skipped {writer.duplicates} near-duplicates ({len(writer)} in {args.root})")
+    else:
+        dataset = CropDataset(args.root)
+        counts = np.bincount(dataset.label_ids, minlength=len(dataset.label_names))
+        print(f"{len(dataset)} crops of {len(dataset.label_names)} labels in {len(dataset.shards)} shards")
+        for label, n in zip(dataset.labels, counts.tolist()):
+            print(f"  {label:<16} {n}")
@@ -0,0 +1,66 @@
+import numpy as np
+from profiling import NULL_PROFILER
+
+PLAYER_CLASSES = (2, 3) # Class IDs for players (adjust if your model has different IDs)
+BALL_CLASS = 0          # Class ID for ball (adjust if your model has different ID)
+
+
+class PlayerDetector:
+    """
+    YOLO player/ball detector that runs several frames per inference call and
+    pulls boxes, confidences and classes out of each result as whole arrays.
+    Inference and box extraction are timed with the profiler as 'yolo' and 'boxes'.
+    Boxes with conf >= conf_threshold are kept, or conf > conf_threshold with
+    strict (the labeling tool always used the strict comparison).
+    """
+
+    def __init__(self, model, conf_threshold=0.3, player_classes=PLAYER_CLASSES, ball_class=BALL_CLASS,
+                 profiler=NULL_PROFILER, strict=False):
+        self.model = model
+        self.profiler = profiler
+        self.conf_threshold = conf_threshold
+        self.strict = strict
+        self.player_classes = np.asarray(player_classes)
+        self.ball_class = ball_class
+
+    def _extract(self, result):
+        """
+        Converts one YOLO result into an (N, 5) [x1, y1, x2, y2, conf] player array and the ball center.
+        """
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return np.empty((0, 5)), None
+        # One device -> host copy per field instead of one per box
+        xyxy = boxes.xyxy.cpu().numpy().astype(int)
+        conf = boxes.conf.cpu().numpy().astype(np.float64) # compared as Python floats were, not in float32
+        cls_id = boxes.cls.cpu().numpy().astype(int)
+
+        # Confidence threshold for detection
+        keep = conf > self.conf_threshold if self.strict else conf >= self.conf_threshold
+        players = keep & np.isin(cls_id, self.player_classes)
+        dets = np.column_stack((xyxy[players], conf[players])) if players.any() else np.empty((0, 5))
+
+        ball_coords = None
+        balls = np.flatnonzero(keep & (cls_id == self.ball_class))
+        if len(balls):
+            x1, y1, x2, y2 = xyxy[balls[-1]]
+            ball_coords = (int((x1 + x2) // 2), int((y1 + y2) // 2))
+        return dets, ball_coords
+
+    def detect_batch(self, frames):
+        """
+        Runs the detector on a list of frames in one inference call.
+        Returns a list of (dets, ball_coords), one per frame.
+        """
+        if not frames:
+            return []
+        with self.profiler.time('yolo', len(frames)):
+            results = self.model(list(frames), verbose=False) # verbose=False to suppress print output
+        with self.profiler.time('boxes', len(frames)):
+            return [self._extract(r) for r in results]
+
+    def detect(self, frame):
+        """
+        Runs the detector on a single frame.
+        """
+        return self.detect_batch([frame])[0]
@@ -0,0 +1,173 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    Returns the SHA-1 hex digest of a file's contents.
+    """
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class CacheLockedError(RuntimeError):
+    """
+    The cache directory is already open in another process.
+    """
+
+
+class EmbeddingCache:
+    """
+    Persistent CLIP embedding and team store for one video, keyed on the video's
+    content hash, the frame index and the track bounding box, so re-runs over the
+    same clip skip CLIP for every new track seen before.
+
+    Layout of <root>/<video hash>[-<tag>]/ (all files are append-only):
+      meta.json       embedding dimension
+      index.i32       int32 records [frame, x1, y1, x2, y2, team_id], one per row
+      embeddings.f16  float16 rows, memory-mapped for reads
+      lock            held exclusively while the cache is open; a second
+                      opener gets CacheLockedError instead of interleaving appends
+    """
+
+    RECORD = 6
+
+    def __init__(self, root, video_path, tag='', flush_every=256):
+        name = file_hash(video_path) + (f"-{tag}" if tag else '')
+        self.dir = os.path.join(root, name)
+        os.makedirs(self.dir, exist_ok=True)
+        self.meta_path = os.path.join(self.dir, 'meta.json')
+        self.index_path = os.path.join(self.dir, 'index.i32')
+        self.emb_path = os.path.join(self.dir, 'embeddings.f16')
+        self.flush_every = flush_every
+        self.hits = 0
+        self.misses = 0
+
+        self._lock_file = open(os.path.join(self.dir, 'lock'), 'a+b')
+        try:
+            if fcntl:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            self._lock_file.close()
+            raise CacheLockedError(f"{self.dir} is in use by another process")
+
+        self.dim = None
+        try:
+            with open(self.meta_path) as f:
+                self.dim = json.load(f)['dim']
+        except (OSError, ValueError, KeyError): # missing, or torn by a crash while it was first written
+            pass
+        index = np.empty((0, self.RECORD), dtype=np.int32)
+        if self.dim and os.path.exists(self.index_path):
+            index = np.fromfile(self.index_path, dtype=np.int32)
+            index = index[:len(index) // self.RECORD * self.RECORD].reshape(-1, self.RECORD)
+        emb_rows = os.path.getsize(self.emb_path) // (2 * self.dim) if self.dim and os.path.exists(self.emb_path) else 0
+        # Cut both files to the rows present in both, so a run interrupted between
+        # the two appends (or before the first index write) leaves them aligned
+        n = min(len(index), emb_rows)
+        index = index[:n]
+        self._truncate(n)
+        self._flushed = len(index)
+        self._teams = list(index[:, 5])
+        self._rows = {tuple(r[:5]): i for i, r in enumerate(index.tolist())}
+        self._embeddings = self._open_memmap()
+        self._pending_index = []
+        self._pending_emb = []
+
+    def __len__(self):
+        return len(self._teams)
+
+    def _truncate(self, n):
+        for path, row_bytes in ((self.index_path, self.RECORD * 4), (self.emb_path, 2 * (self.dim or 0))):
+            if os.path.exists(path):
+                with open(path, 'r+b') as f:
+                    f.truncate(n * row_bytes)
+
+    def _open_memmap(self):
+        if not self._flushed:
+            return None
+        return np.memmap(self.emb_path, dtype=np.float16, mode='r', shape=(self._flushed, self.dim))
+
+    def get(self, frame_index, bboxes):
+        """
+        Looks up the boxes of one frame.
+        Returns (embeddings float32 (N, D), team_ids (N,), hit mask); rows of misses are zeros / -1.
+        """
+        bboxes = np.asarray(bboxes).astype(int).reshape(-1, 4)
+        embeddings = np.zeros((len(bboxes), self.dim or 0), dtype=np.float32)
+        team_ids = np.full(len(bboxes), -1, dtype=int)
+        hit = np.zeros(len(bboxes), dtype=bool)
+        for i, box in enumerate(bboxes.tolist()):
+            row = self._rows.get((frame_index, *box))
+            if row is None:
+                continue
+            if row < self._flushed:
+                embeddings[i] = self._embeddings[row]
+            else:
+                embeddings[i] = self._pending_emb[row - self._flushed]
+            team_ids[i] = self._teams[row]
+            hit[i] = True
+        self.hits += int(hit.sum())
+        self.misses += int(len(hit) - hit.sum())
+        return embeddings, team_ids, hit
+
+    def put(self, frame_index, bboxes, embeddings, team_ids):
+        """
+        Adds the embeddings and teams computed for boxes of one frame.
+        """
+        bboxes = np.asarray(bboxes).astype(int).reshape(-1, 4)
+        if len(bboxes) == 0:
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float16).reshape(len(bboxes), -1)
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+            with open(self.meta_path, 'w') as f:
+                json.dump({'dim': self.dim}, f)
+        for box, emb, team_id in zip(bboxes.tolist(), embeddings, team_ids):
+            key = (frame_index, *box)
+            if key in self._rows:
+                continue
+            self._rows[key] = len(self._teams)
+            self._teams.append(int(team_id))
+            self._pending_index.append(key + (int(team_id),))
+            self._pending_emb.append(emb)
+        if len(self._pending_emb) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Appends the pending rows to disk in one write per file.
+        """
+        if not self._pending_emb:
+            return
+        # Embeddings first, so the index never points past the data
+        with open(self.emb_path, 'ab') as f:
+            np.stack(self._pending_emb).astype(np.float16).tofile(f)
+        with open(self.index_path, 'ab') as f:
+            np.array(self._pending_index, dtype=np.int32).tofile(f)
+        self._flushed += len(self._pending_emb)
+        self._pending_index = []
+        self._pending_emb = []
+        self._embeddings = self._open_memmap()
+
+    def close(self):
+        if self._lock_file.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._embeddings = None
+            self._lock_file.close() # releases the lock
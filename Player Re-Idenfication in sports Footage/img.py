@@ -1,49 +1,72 @@
 import os
 import cv2
 from ultralytics import YOLO
+from detection import PlayerDetector
+from labeling import CropWriter, DetectionPrefetcher, LabelIndex, LabelLog, TrackLabels, export_crops
+from dataset_builder import DatasetWriter
+
+SEEK_STEP = 25 # frames per '[' / ']' jump
+CROP_EVERY = 5 # export every k-th frame of a labelled track
+MAX_CROPS_PER_TRACK = 200
 
 # Load YOLO model
 model = YOLO("models/yolo_players.pt")
+detector = PlayerDetector(model, strict=True)
 
-# Load video
-cap = cv2.VideoCapture("videos/15sec_input_720p.mp4")
-
-# Output folder
+# Output folder: sharded crop dataset (see dataset_builder.py), near-duplicates dropped
 save_dir = "players_dataset"
 os.makedirs(save_dir, exist_ok=True)
 
+# Load video; detections run ahead on a background thread and are kept across sessions
+video_path = "videos/15sec_input_720p.mp4"
+video_name = os.path.splitext(os.path.basename(video_path))[0]
+detections_path = os.path.join(save_dir, video_name + "_detections.npz")
+frames = DetectionPrefetcher(video_path, detector, detections=DetectionPrefetcher.load(detections_path))
+dataset = DatasetWriter(save_dir)
+writer = CropWriter(target=dataset)  # crops go into the dataset on a background thread
+
 # State tracking
 frame_idx = 0
 frame = None
 display_frame = None
 current_detections = []
 selected_box = None
-label_map = {}  # {(frame_idx, box_idx): 'pX'}
-
-def detect_players(f):
-    results = model(f, verbose=False)[0]
-    detections = []
-    for box in results.boxes:
-        x1, y1, x2, y2 = map(int, box.xyxy[0].cpu().numpy())
-        conf = float(box.conf[0])
-        cls_id = int(box.cls[0])
-        if conf > 0.3 and cls_id in [2, 3]:  # player class IDs
-            detections.append((x1, y1, x2, y2))
-    return detections
+labels = LabelIndex()  # per frame: {box_idx: 'pX'}
+tracks = TrackLabels(labels)  # labels follow SORT tracks forward
+label_log = LabelLog(os.path.join(save_dir, video_name + "_labels.jsonl"))  # every label, saved as it is given
 
 def draw_detections():
     global display_frame
     display_frame = frame.copy()
+    frame_labels = labels.labels(frame_idx)
     for i, (x1, y1, x2, y2) in enumerate(current_detections):
         if selected_box == i:
             color = (0, 0, 255)  # red for selected
         else:
-            color = (0, 255, 0) if (frame_idx, i) in label_map else (0, 255, 255)
+            color = (0, 255, 0) if i in frame_labels else (0, 255, 255)
         cv2.rectangle(display_frame, (x1, y1), (x2, y2), color, 2)
-        label = label_map.get((frame_idx, i))
+        label = frame_labels.get(i)
         if label:
             cv2.putText(display_frame, label, (x1, y1 - 10),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+    cv2.putText(display_frame, f"frame {frame_idx}", (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+def show_frame(index):
+    """
+    Moves to a frame (detections come from the prefetch cache). Returns False past the end.
+    """
+    global frame, frame_idx, current_detections, selected_box
+    index = max(0, index)
+    if frames.frame_count is not None:
+        index = min(index, frames.frame_count - 1)
+    f, boxes = frames.get(index)
+    if f is None:
+        return False
+    frame, frame_idx, current_detections = f, index, boxes
+    tracks.advance(frames.detections)  # carry labels onto the newly detected frames
+    selected_box = None
+    draw_detections()
+    return True
 
 def mouse_callback(event, x, y, flags, param):
     global selected_box
@@ -59,21 +82,27 @@ cv2.namedWindow("Player Labeling")
 cv2.setMouseCallback("Player Labeling", mouse_callback)
 
 print("\n✅ INSTRUCTIONS:")
-print(" - Press 'n' to go to next frame.")
+print(" - Press 'n' or '.' to go to next frame, ',' for the previous one.")
+print(f" - Press ']' / '[' to jump {SEEK_STEP} frames forward / back.")
 print(" - Click a player box to select it.")
-print(" - Press a key (0–9, a–z, A–Z) to assign label.")
+print(" - Press a key (0–9, a–z, A–Z) to assign label; it follows the player until the track breaks.")
 print(" - Press 'q' to quit.\n")
 
 # Load the first frame
-ret, frame = cap.read()
-if not ret:
+if not frames.isOpened() or not show_frame(0):
     print("❌ Could not read the first frame.")
-    cap.release()
+    frames.release()
+    writer.close()
+    dataset.close()
+    label_log.close()
     exit()
 
-current_detections = detect_players(frame)
-draw_detections()
-frame_idx += 1
+# Labels of earlier sessions over this video
+if len(label_log):
+    lost = label_log.replay(frames, tracks)
+    print(f"[INFO] Restored {len(label_log) - lost} labels from {label_log.path}"
+          + (f" ({lost} no longer match a box)" if lost else ""))
+    show_frame(0)
 
 while True:
     if display_frame is not None:
@@ -84,16 +113,20 @@ while True:
     if key == ord('q'):
         break
 
-    # Load next frame on 'n'
-    if key == ord('n'):
-        ret, frame = cap.read()
-        if not ret:
+    # Navigation
+    if key in (ord('n'), ord('.')):
+        if not show_frame(frame_idx + 1):
             print("✅ End of video.")
-            break
-        selected_box = None
-        current_detections = detect_players(frame)
-        draw_detections()
-        frame_idx += 1
+        continue
+    if key == ord(','):
+        show_frame(frame_idx - 1)
+        continue
+    if key == ord(']'):
+        show_frame(frame_idx + SEEK_STEP)
+        continue
+    if key == ord('['):
+        show_frame(frame_idx - SEEK_STEP)
+        continue
 
     # Handle labeling
     if selected_box is not None:
@@ -103,28 +136,32 @@ while True:
 
             label_char = chr(key).upper()
             label = f"p{label_char}"
-            box_key = (frame_idx, selected_box)
 
-            # Avoid duplicate labels in same frame
-            existing_labels = [v for (f, _), v in label_map.items() if f == frame_idx]
-            if label in existing_labels:
-                print(f"⚠️ Label '{label}' already used in this frame.")
+            # Avoid duplicate labels in same frame (here or further along the track)
+            if not tracks.label(frame_idx, selected_box, label):
+                print(f"⚠️ Label '{label}' already used in this frame or later on this track.")
                 selected_box = None
                 draw_detections()
                 continue
 
-            label_map[box_key] = label
-
-            x1, y1, x2, y2 = current_detections[selected_box]
-            crop = frame[y1:y2, x1:x2]
-            if crop.size != 0:
-                filename = f"{label}_f{frame_idx}.jpg"
-                path = os.path.join(save_dir, filename)
-                cv2.imwrite(path, crop)
-                print(f"✅ Label '{label}' assigned to box {selected_box} at frame {frame_idx} — saved {filename}")
+            label_log.append(frame_idx, selected_box, current_detections[selected_box], label)
+            track_id = tracks.track_id(frame_idx, selected_box)
+            print(f"✅ Label '{label}' assigned to box {selected_box} at frame {frame_idx}"
+                  + (f" and its track {track_id}" if track_id is not None else ""))
 
             selected_box = None
             draw_detections()
 
-cap.release()
+frames.release()
+label_log.close()
 cv2.destroyAllWindows()
+
+# Crops of every labelled track, sampled; also detects and tracks the frames skipped while seeking
+print("Exporting crops...")
+export_crops(video_path, detector, frames.detections, tracks, writer,
+             every=CROP_EVERY, max_per_track=MAX_CROPS_PER_TRACK)
+frames.save(detections_path)
+writer.close()
+dataset.close()
+print(f"Saved {writer.written} crops to {save_dir} ({writer.skipped} near-duplicates skipped, {len(dataset)} in total)"
+      + (f", {len(writer.failed)} failed" if writer.failed else ""))
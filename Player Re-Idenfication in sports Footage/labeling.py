@@ -0,0 +1,479 @@
+"""
+Building blocks of the player labeling tool (img.py).
+
+DetectionPrefetcher decodes and detects frames ahead of the one on screen on a
+background thread, so stepping through the video never waits for YOLO, and
+keeps the detections of every visited frame so seeking back is instant.
+LabelIndex keeps the labels per frame for O(1) lookups and duplicate checks.
+TrackLabels runs SORT over the detections so that a label given to one box
+follows that player's track, and export_crops writes the crops of every labelled
+frame, sampled per track. LabelLog writes every label to disk the moment it is
+given and puts them back at the start of the next session.
+CropWriter saves labelled crops on a background thread in batches, as JPEG files
+or through a dataset_builder.DatasetWriter (the sharded store with the same add()).
+"""
+import os
+import json
+import queue
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from sort.sort import Sort, iou_batch, linear_assignment
+
+
+class DetectionPrefetcher:
+    """
+    Background decoder + detector for random access to (frame, boxes) by frame index.
+    The worker stays up to `ahead` frames in front of the last requested frame and
+    runs the detector on batch_size frames per call. Detections are cached for
+    every frame seen (and can be saved and reloaded with the dataset, so a second
+    session over the same video skips detection); decoded frames are kept in an
+    LRU of `keep` frames around the cursor. Requests outside that window seek.
+    """
+
+    def __init__(self, video_path, detector, ahead=32, batch_size=4, keep=96, detections=None):
+        self.detector = detector
+        self.ahead = ahead
+        self.batch_size = batch_size
+        self.keep = max(keep, ahead + batch_size)
+        self.detections = dict(detections or {}) # frame index -> [(x1, y1, x2, y2), ...]
+        self.frames = OrderedDict()               # frame index -> decoded frame (LRU)
+        self.cap = cv2.VideoCapture(video_path)
+        count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.frame_count = count if count > 0 else None # None until the end is reached
+        self.cursor = 0
+        self._next = 0       # index of the frame the worker decodes next
+        self._seek = None
+        self._ended = False
+        self._error = None
+        self._stop = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='label-prefetch', daemon=True)
+        if self.cap.isOpened():
+            self._thread.start()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def _evict(self):
+        # Drop the frames farthest from the cursor
+        while len(self.frames) > self.keep:
+            far = max(self.frames, key=lambda i: abs(i - self.cursor))
+            del self.frames[far]
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self._stop and self._seek is None and (
+                            self._ended or self._next >= self.cursor + self.ahead):
+                        self._cond.wait()
+                    if self._stop:
+                        return
+                    if self._seek is not None:
+                        self.cap.set(cv2.CAP_PROP_POS_FRAMES, self._seek)
+                        self._next, self._seek, self._ended = self._seek, None, False
+                    start = self._next
+                    n = max(1, min(self.batch_size, self.cursor + self.ahead - start))
+
+                batch = []
+                for _ in range(n):
+                    ret, frame = self.cap.read()
+                    if not ret:
+                        break
+                    batch.append(frame)
+                todo = [i for i in range(len(batch)) if start + i not in self.detections]
+                found = self.detector.detect_batch([batch[i] for i in todo]) if todo else []
+
+                with self._cond:
+                    if self._seek is not None:
+                        continue # the user jumped elsewhere meanwhile, this batch is stale for the LRU
+                    for i, (dets, _) in zip(todo, found):
+                        self.detections[start + i] = [tuple(int(v) for v in d[:4]) for d in dets]
+                    for i, frame in enumerate(batch):
+                        self.frames[start + i] = frame
+                    self._next = start + len(batch)
+                    if len(batch) < n:
+                        self._ended = True
+                        self.frame_count = self._next
+                    self._evict()
+                    self._cond.notify_all()
+        except Exception as e:
+            with self._cond:
+                self._error = e
+                self._cond.notify_all()
+
+    def get(self, frame_index):
+        """
+        Returns (frame, boxes) for a frame index, waiting if the worker has not got
+        there yet, or (None, None) past the end of the video.
+        """
+        with self._cond:
+            self.cursor = frame_index
+            if frame_index not in self.frames and not (self._next <= frame_index < self._next + self.ahead):
+                self._seek = frame_index
+            self._cond.notify_all()
+            while frame_index not in self.frames:
+                if self._error is not None:
+                    raise self._error
+                if self._ended and self._seek is None and frame_index >= self._next:
+                    return None, None
+                self._cond.wait()
+            self.frames.move_to_end(frame_index)
+            return self.frames[frame_index], self.detections[frame_index]
+
+    def save(self, path):
+        """
+        Saves the cached detections (frame index and box per row) to an .npz file.
+        """
+        rows = [(i, *box) for i, boxes in self.detections.items() for box in boxes]
+        np.savez_compressed(path, boxes=np.array(rows, dtype=np.int32).reshape(-1, 5),
+                            frames=np.array(sorted(self.detections), dtype=np.int64))
+
+    @staticmethod
+    def load(path):
+        """
+        Detections saved with save(), or an empty dict if there is no file.
+        """
+        if not os.path.exists(path):
+            return {}
+        data = np.load(path)
+        detections = {int(i): [] for i in data['frames']}
+        for i, x1, y1, x2, y2 in data['boxes'].tolist():
+            detections[i].append((x1, y1, x2, y2))
+        return detections
+
+    def release(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._thread.is_alive():
+            self._thread.join(timeout=2.0)
+        self.cap.release()
+
+
+class LabelIndex:
+    """
+    Labels per frame: {frame index: {box index: label}} plus the reverse map per
+    frame, so drawing a frame and rejecting a label already used in it never scan
+    the labels of other frames.
+    """
+
+    def __init__(self):
+        self.by_frame = {}
+        self._boxes_by_label = {} # frame index -> {label: box index}
+
+    def __len__(self):
+        return sum(len(boxes) for boxes in self.by_frame.values())
+
+    def get(self, frame_index, box_index):
+        return self.by_frame.get(frame_index, {}).get(box_index)
+
+    def labels(self, frame_index):
+        """
+        {box index: label} of one frame.
+        """
+        return self.by_frame.get(frame_index, {})
+
+    def box_of(self, frame_index, label):
+        """
+        Box index that carries the label in the frame, or None.
+        """
+        return self._boxes_by_label.get(frame_index, {}).get(label)
+
+    def assign(self, frame_index, box_index, label):
+        """
+        Labels a box. Returns False if another box of the frame already has the label.
+        Relabelling a box replaces its previous label.
+        """
+        owner = self.box_of(frame_index, label)
+        if owner is not None and owner != box_index:
+            return False
+        self.remove(frame_index, box_index)
+        self.by_frame.setdefault(frame_index, {})[box_index] = label
+        self._boxes_by_label.setdefault(frame_index, {})[label] = box_index
+        return True
+
+    def remove(self, frame_index, box_index):
+        """
+        Removes a box's label; returns it, or None if the box was unlabelled.
+        """
+        label = self.by_frame.get(frame_index, {}).pop(box_index, None)
+        if label is not None:
+            del self._boxes_by_label[frame_index][label]
+        return label
+
+
+class LabelLog:
+    """
+    Append-only log of the labels given in the labeling tool, one JSON line per
+    label: {"frame", "box" (index), "bbox", "label"}. Each line is written and
+    flushed when the label is given, so a crash or a closed window loses nothing;
+    replay() reapplies the log at the start of the next session. A line torn by a
+    crash is cut off on open.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = []
+        valid_bytes = 0
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b'\n'):
+                        break
+                    valid_bytes += len(line)
+                    self.records.append(record)
+            with open(path, 'r+b') as f:
+                f.truncate(valid_bytes)
+        self._file = open(path, 'a')
+
+    def __len__(self):
+        return len(self.records)
+
+    def append(self, frame_index, box_index, bbox, label):
+        record = {'frame': frame_index, 'box': box_index, 'bbox': [int(v) for v in bbox], 'label': label}
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        self.records.append(record)
+
+    def replay(self, frames, tracks, min_iou=0.5):
+        """
+        Reapplies the logged labels, in the order they were given, to a TrackLabels
+        over a DetectionPrefetcher. Logged frames without cached detections (the
+        session before ended without saving them) are detected first, and each
+        label goes to the box that matches its logged bbox.
+        Returns the number of labels that could not be placed.
+        """
+        for frame_index in sorted({r['frame'] for r in self.records} - set(frames.detections)):
+            frames.get(frame_index)
+        tracks.advance(frames.detections)
+        lost = 0
+        for r in self.records:
+            boxes = frames.detections.get(r['frame'], [])
+            box_index = r['box']
+            if box_index >= len(boxes) or list(boxes[box_index]) != r['bbox']:
+                # Detections differ from the logged session; take the best overlapping box
+                iou = iou_batch(np.array([r['bbox']], dtype=float), np.array(boxes, dtype=float).reshape(-1, 4))[0]
+                box_index = int(iou.argmax()) if len(boxes) and iou.max() >= min_iou else None
+            if box_index is None or not tracks.label(r['frame'], box_index, r['label']):
+                lost += 1
+        return lost
+
+    def close(self):
+        self._file.close()
+
+
+class CropWriter:
+    """
+    Writes image crops on a background thread, batch_size per wake-up.
+    put() and add() copy the crop, so the caller may reuse its frame buffer right away.
+    add() names labelled crops <label>_f<frame>.jpg in save_dir or, with a target
+    (a dataset_builder.DatasetWriter), hands them to target.add() on the writer
+    thread; crops the target drops as near-duplicates count in skipped.
+    close() does not close the target.
+    """
+
+    def __init__(self, save_dir=".", batch_size=16, target=None):
+        self.save_dir = save_dir
+        self.batch_size = batch_size
+        self.target = target
+        self.written = 0
+        self.skipped = 0
+        self.failed = []
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='crop-writer', daemon=True)
+        self._thread.start()
+
+    def put(self, path, crop):
+        self._queue.put((path, crop.copy()))
+
+    def add(self, crop, label, frame=-1, bbox=None, video=None):
+        if self.target is None:
+            self.put(os.path.join(self.save_dir, f"{label}_f{frame}.jpg"), crop)
+        else:
+            self._queue.put((None, (crop.copy(), label, frame, bbox if bbox is not None else (0, 0, 0, 0), video)))
+        return True
+
+    def _write(self, path, crop):
+        if path is None:
+            if self.target.add(*crop):
+                self.written += 1
+            else:
+                self.skipped += 1
+        elif cv2.imwrite(path, crop):
+            self.written += 1
+        else:
+            self.failed.append(path)
+
+    def _run(self):
+        done = False
+        while not done:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for item in batch:
+                if item is None:
+                    done = True
+                    continue
+                try:
+                    self._write(*item)
+                except Exception as e: # keep draining, so close() never hangs
+                    self.failed.append(repr(e))
+
+    def close(self):
+        """
+        Writes the remaining crops and stops the thread.
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+
+class TrackLabels:
+    """
+    Propagates labels along SORT tracks.
+    Frames are tracked in order as their detections become available (advance()),
+    and every detection box gets the ID of the track it was matched to. A label
+    assigned to a box (label()) is attached to its track from that frame on and
+    written into the LabelIndex for every later frame of the track, so the
+    annotator only labels a player again when SORT loses them and a new track
+    starts. Labels given on frames not tracked yet are applied once tracking gets there.
+    """
+
+    def __init__(self, labels, max_age=1, iou_threshold=0.3, match_iou=0.5):
+        self.labels = labels
+        self.match_iou = match_iou
+        # Every detection gets a track ID from its first frame on
+        self.tracker = Sort(max_age=max_age, min_hits=0, iou_threshold=iou_threshold)
+        self.frames_done = 0      # frames [0, frames_done) are tracked
+        self.track_of = {}        # (frame index, box index) -> track ID
+        self.members = {}         # track ID -> [(frame index, box index), ...] in frame order
+        self.track_labels = {}    # track ID -> label
+        self.conflicts = 0        # propagated labels dropped because the frame already used them
+        self._pending = {}        # (frame index, box index) -> label, for frames not tracked yet
+
+    def _match(self, boxes, tracks):
+        """
+        Track ID of each detection box (-1 if none); SORT reports its Kalman boxes,
+        not the detections, so they are paired up by IoU.
+        """
+        ids = np.full(len(boxes), -1, dtype=int)
+        if len(boxes) == 0 or len(tracks) == 0:
+            return ids
+        iou = iou_batch(np.asarray(boxes, dtype=float), tracks[:, :4])
+        for det, trk in linear_assignment(-iou):
+            if iou[det, trk] >= self.match_iou:
+                ids[det] = int(tracks[trk, 4])
+        return ids
+
+    def advance(self, detections):
+        """
+        Tracks the frames that follow the tracked ones and have detections
+        ({frame index: boxes}, e.g. DetectionPrefetcher.detections).
+        """
+        while self.frames_done in detections:
+            self.track_frame(self.frames_done, detections[self.frames_done])
+
+    def track_frame(self, frame_index, boxes):
+        """
+        Runs SORT on the next frame and carries the labels of its tracks over.
+        """
+        assert frame_index == self.frames_done, "frames must be tracked in order"
+        dets = np.array([(*box, 1.0) for box in boxes], dtype=float).reshape(-1, 5)
+        ids = self._match(boxes, self.tracker.update(dets))
+        for box_index, track_id in enumerate(ids.tolist()):
+            if track_id < 0:
+                continue
+            self.track_of[(frame_index, box_index)] = track_id
+            self.members.setdefault(track_id, []).append((frame_index, box_index))
+            pending = self._pending.pop((frame_index, box_index), None)
+            if pending is not None:
+                self.label(frame_index, box_index, pending)
+            elif track_id in self.track_labels:
+                if not self.labels.assign(frame_index, box_index, self.track_labels[track_id]):
+                    self.conflicts += 1
+        self.frames_done += 1
+
+    def label(self, frame_index, box_index, label):
+        """
+        Labels a box and the rest of its track.
+        Returns False (and changes nothing) if the label is already used in one
+        of the frames it would propagate to.
+        """
+        track_id = self.track_of.get((frame_index, box_index))
+        if track_id is None:
+            if not self.labels.assign(frame_index, box_index, label):
+                return False
+            if frame_index >= self.frames_done:
+                self._pending[(frame_index, box_index)] = label
+            return True
+        span = [(f, b) for f, b in self.members[track_id] if f >= frame_index]
+        if any(self.labels.box_of(f, label) not in (None, b) for f, b in span):
+            return False
+        for f, b in span:
+            self.labels.assign(f, b, label)
+        self.track_labels[track_id] = label
+        return True
+
+    def track_id(self, frame_index, box_index):
+        return self.track_of.get((frame_index, box_index))
+
+
+def export_crops(video_path, detector, detections, tracks, writer, every=1, max_per_track=None, batch_size=8):
+    """
+    Adds the crop of every labelled box in the video to writer (a CropWriter or a
+    dataset_builder.DatasetWriter, which may drop near-duplicates; through a
+    CropWriter those still count towards max_per_track).
+    Frames the labeling session skipped over are detected here, in batches,
+    and tracking is finished on the way, so labels reach the end of their tracks.
+    Along each track only every `every`-th labelled frame is exported, at most
+    max_per_track of them; boxes labelled outside a track are always exported.
+    Returns the number of crops the writer took.
+    """
+    cap = cv2.VideoCapture(video_path)
+    exported = {} # track ID -> (crops written, labelled frames seen)
+    queued = 0
+    frame_index = 0
+    try:
+        while True:
+            batch = []
+            for _ in range(batch_size):
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                batch.append(frame)
+            if not batch:
+                break
+            todo = [i for i in range(len(batch)) if frame_index + i not in detections]
+            for i, (dets, _) in zip(todo, detector.detect_batch([batch[i] for i in todo]) if todo else []):
+                detections[frame_index + i] = [tuple(int(v) for v in d[:4]) for d in dets]
+
+            for frame in batch:
+                if frame_index >= tracks.frames_done:
+                    tracks.track_frame(frame_index, detections[frame_index])
+                boxes = detections[frame_index]
+                for box_index, label in tracks.labels.labels(frame_index).items():
+                    track_id = tracks.track_id(frame_index, box_index)
+                    written, seen = exported.get(track_id, (0, 0))
+                    if track_id is not None:
+                        exported[track_id] = (written, seen + 1)
+                        if seen % every or (max_per_track is not None and written >= max_per_track):
+                            continue
+                    x1, y1, x2, y2 = boxes[box_index]
+                    crop = frame[max(y1, 0):y2, max(x1, 0):x2]
+                    if crop.size != 0 and writer.add(crop, label, frame_index, (x1, y1, x2, y2), video_path):
+                        queued += 1
+                        if track_id is not None:
+                            exported[track_id] = (written + 1, seen + 1)
+                frame_index += 1
+    finally:
+        cap.release()
+    return queued
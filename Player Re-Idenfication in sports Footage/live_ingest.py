@@ -0,0 +1,139 @@
+"""
+Live ingest for touchline feeds: an RTSP/HTTP stream URL or a camera device index
+is decoded on a dedicated thread into a single latest-frame-wins slot, so when the
+analysis falls behind, stale frames are dropped instead of queued and latency
+stays bounded. A video file can be replayed at its native frame rate as a
+stand-in for a stream.
+
+LiveCapture is a drop-in for the cv2.VideoCapture that analyze_video reads from.
+"""
+import os
+import time
+import threading
+import cv2
+
+from profiling import LatencyHistogram
+
+
+def open_source(source):
+    """
+    Returns a device index for digit strings ('0' = first webcam), the source unchanged otherwise.
+    """
+    return int(source) if isinstance(source, str) and source.isdigit() else source
+
+
+class LiveCapture:
+    """
+    Decodes a stream on a background thread and hands out only the newest frame.
+    Frames overwritten in the slot before read() picked them up count as dropped.
+    With realtime (the default for files) decoding is paced to the source fps,
+    like a camera would deliver them.
+    """
+
+    def __init__(self, source, realtime=None):
+        source = open_source(source)
+        self.cap = cv2.VideoCapture(source)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1) # don't let the backend queue stale frames either
+        is_file = isinstance(source, str) and os.path.isfile(source)
+        self.realtime = is_file if realtime is None else realtime
+        self.decoded = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.frame_time = None # perf_counter() at which the last frame read() returned was decoded
+        self._cond = threading.Condition()
+        self._frame = None
+        self._time = None
+        self._ended = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._decode, name='live-ingest', daemon=True)
+        if self.cap.isOpened():
+            self._thread.start()
+
+    def _decode(self):
+        fps = self.cap.get(cv2.CAP_PROP_FPS) or 25
+        start = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                if self.realtime:
+                    delay = start + self.decoded / fps - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                with self._cond:
+                    if self._frame is not None:
+                        self.dropped += 1 # analysis is behind, the older frame is never seen
+                    self._frame = frame
+                    self._time = time.perf_counter()
+                    self.decoded += 1
+                    self._cond.notify()
+        finally:
+            with self._cond:
+                self._ended = True
+                self._cond.notify_all()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def read(self):
+        """
+        Waits for a frame newer than the last one returned.
+        Returns (False, None) once the stream has ended.
+        """
+        with self._cond:
+            while self._frame is None and not self._ended:
+                self._cond.wait()
+            if self._frame is None:
+                return False, None
+            frame, self.frame_time = self._frame, self._time
+            self._frame = None
+            self.delivered += 1
+        return True, frame
+
+    def release(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=2.0)
+        self.cap.release()
+
+    @property
+    def drop_rate(self):
+        return self.dropped / self.decoded if self.decoded else 0.0
+
+
+class LatencyMeter:
+    """
+    Decode-to-output latency of the frames that made it through the pipeline,
+    kept in a fixed-size LatencyHistogram so an always-on stream uses constant memory.
+    """
+
+    def __init__(self):
+        self.latencies = LatencyHistogram()
+
+    def record(self, captured):
+        """
+        Records one finished frame, given the perf_counter() time it was decoded at.
+        """
+        self.latencies.record(time.perf_counter() - captured)
+
+    def report(self, capture=None, pipeline_dropped=0):
+        """
+        Formats latency percentiles and, for a LiveCapture, the drop rate: frames
+        overwritten in the capture slot plus pipeline_dropped, the frames the
+        pipeline dropped from its stage queues (see run_pipelined drop_stale).
+        """
+        lines = []
+        h = self.latencies
+        if h.count:
+            lines.append(f"Latency over {h.count} frames: p50 {1000 * h.percentile(50):.1f} ms, "
+                         f"p95 {1000 * h.percentile(95):.1f} ms, max {1000 * h.max:.1f} ms")
+        if capture is not None:
+            dropped = capture.dropped + pipeline_dropped
+            rate = dropped / capture.decoded if capture.decoded else 0.0
+            lines.append(f"Dropped {dropped} of {capture.decoded} decoded frames ({100 * rate:.1f}%): "
+                         f"{capture.dropped} at capture, {pipeline_dropped} in the pipeline")
+        return "\n".join(lines)
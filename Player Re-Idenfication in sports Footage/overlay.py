@@ -0,0 +1,112 @@
+import time
+import cv2
+import numpy as np
+from profiling import LatencyHistogram
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FOOT_RING_COLOR = (0, 255, 255)
+PANEL = (10, 10, 320, 80) # possession panel x1, y1, x2, y2
+
+
+class OverlayRenderer:
+    """
+    Draws the match overlay onto frames in place, with little work per frame:
+    track ID label sizes are measured once per ID instead of per frame, and the
+    possession panel is rasterised only when its numbers change and blitted otherwise.
+    Everything that changes every frame still goes straight through OpenCV; putText
+    anti-aliases, so an exact blit of a cached text sprite needs an alpha blend,
+    which measures slower than the putText call it would replace.
+    The time of every render() is recorded in a fixed-size LatencyHistogram and
+    reported against budget_ms.
+    """
+
+    def __init__(self, team_colors, budget_ms=5.0):
+        self.team_colors = team_colors
+        self.budget_ms = budget_ms
+        self.unknown = ("Unknown", (100, 100, 100)) # Default for unknown team
+        self._label_sizes = {} # track ID -> (label, width, height)
+        self._panel_key = None
+        self._panel = None
+        self.times = LatencyHistogram()
+        self.over_budget = 0 # renders that took longer than budget_ms
+
+    def _label(self, track_id):
+        entry = self._label_sizes.get(track_id)
+        if entry is None:
+            label = f"{track_id}"
+            (w, h), _ = cv2.getTextSize(label, FONT, 0.6, 2)
+            entry = self._label_sizes[track_id] = (label, w, h)
+        return entry
+
+    def _draw_panel(self, frame, possession):
+        x1, y1, x2, y2 = PANEL
+        key = tuple((tid, f"Team {self.team_colors[tid][0]} Control: {percent:.2f}%")
+                    for tid, percent in possession.items())
+        if key != self._panel_key:
+            # The panel is opaque, so its pixels only depend on the text
+            canvas = np.zeros((y2 + 1, x2 + 1, 3), dtype=np.uint8)
+            cv2.rectangle(canvas, (x1, y1), (x2, y2), (255, 255, 255), -1) # White background
+            for tid, txt in key:
+                cv2.putText(canvas, txt, (15, 30 + tid * 20), FONT, 0.55, self.team_colors[tid][1], 2)
+            self._panel = canvas[y1:, x1:]
+            self._panel_key = key
+        h = min(self._panel.shape[0], frame.shape[0] - y1)
+        w = min(self._panel.shape[1], frame.shape[1] - x1)
+        if h > 0 and w > 0:
+            frame[y1:y1 + h, x1:x1 + w] = self._panel[:h, :w]
+
+    def render(self, frame, stats):
+        """
+        Draws boxes, labels, speed/distance, ball, possession panel and camera motion
+        onto the frame in place.
+        """
+        start = time.perf_counter()
+        ring_y_max = frame.shape[0] - 1
+        put_text, rectangle, circle = cv2.putText, cv2.rectangle, cv2.circle
+        for track_id, (x1, y1, x2, y2), center_pos, team_id, speed, dist, _ in stats.players:
+            color = self.team_colors.get(team_id, self.unknown)[1]
+            rectangle(frame, (x1, y1), (x2, y2), color, 2)
+
+            # Yellow ring at feet, kept inside the frame
+            circle(frame, (center_pos[0], min(y2 + 5, ring_y_max)), 5, FOOT_RING_COLOR, 2)
+
+            # Centered track ID label, kept below the top edge
+            label, text_w, text_h = self._label(track_id)
+            put_text(frame, label, (center_pos[0] - text_w // 2, max(y1 - 10, text_h + 5)), FONT, 0.6, color, 2)
+
+            # Speed & distance info, black outline then white text
+            speed_line, dist_line = f"{speed:.2f} km/h", f"{dist:.2f} m"
+            put_text(frame, speed_line, (x1, y2 + 20), FONT, 0.5, (0, 0, 0), 3)
+            put_text(frame, speed_line, (x1, y2 + 20), FONT, 0.5, (255, 255, 255), 1)
+            put_text(frame, dist_line, (x1, y2 + 35), FONT, 0.5, (0, 0, 0), 3)
+            put_text(frame, dist_line, (x1, y2 + 35), FONT, 0.5, (255, 255, 255), 1)
+
+        # Ball display
+        ball_coords = stats.ball_coords
+        if ball_coords:
+            circle(frame, ball_coords, 6, (0, 255, 255), -1) # Yellow filled circle
+            org = (ball_coords[0] + 5, ball_coords[1] - 10)
+            put_text(frame, "Ball", org, FONT, 0.6, (0, 0, 0), 2)
+            put_text(frame, "Ball", org, FONT, 0.6, (255, 255, 255), 1)
+
+        self._draw_panel(frame, stats.possession)
+
+        # Camera movement since the previous frame
+        camera_x, camera_y = stats.camera_motion
+        put_text(frame, f"Camera Movement X: {camera_x:.2f}", (10, 100), FONT, 0.6, (255, 255, 255), 2)
+        put_text(frame, f"Camera Movement Y: {camera_y:.2f}", (10, 130), FONT, 0.6, (255, 255, 255), 2)
+        elapsed = time.perf_counter() - start
+        self.times.record(elapsed)
+        if 1000 * elapsed > self.budget_ms:
+            self.over_budget += 1
+
+    def report(self):
+        """
+        Formats the measured render time per frame against the budget.
+        """
+        h = self.times
+        if not h.count:
+            return "Render: no frames"
+        return (f"Render: mean {1000 * h.mean:.2f} ms, p95 {1000 * h.percentile(95):.2f} ms, "
+                f"max {1000 * h.max:.2f} ms; {self.over_budget} of {h.count} frames over the "
+                f"{self.budget_ms:.1f} ms budget")
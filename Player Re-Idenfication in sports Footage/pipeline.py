@@ -0,0 +1,207 @@
+import queue
+import threading
+import time
+from profiling import NULL_PROFILER
+
+_END = object() # End-of-stream marker passed down the queues
+
+
+def _size(item):
+    # A list item is a batch of frames and counts as that many frames
+    return len(item) if isinstance(item, list) else 1
+
+
+class Stage:
+    """
+    One step of the frame pipeline: a function applied to every item, in order.
+    Keeps count of processed frames and the time spent inside the function, and
+    records the time per frame of every item with the profiler as 'stage.<name>'.
+    """
+
+    def __init__(self, name, fn, profiler=NULL_PROFILER):
+        self.name = name
+        self.fn = fn
+        self.profiler = profiler
+        self.count = 0
+        self.busy = 0.0
+
+    def __call__(self, item):
+        start = time.perf_counter()
+        n = _size(item)
+        self.count += n
+        item = self.fn(item)
+        elapsed = time.perf_counter() - start
+        self.busy += elapsed
+        self.profiler.record('stage.' + self.name, elapsed / max(n, 1), n)
+        return item
+
+
+def _put(q, item, stop_event):
+    """
+    Blocking put that gives up once the pipeline is stopped.
+    """
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _put_latest(q, item, stop_event):
+    """
+    Non-blocking put that makes room by dropping the oldest queued item.
+    Returns the number of frames dropped. The end marker is never dropped: it is
+    the last item its producer puts.
+    """
+    dropped = 0
+    while not stop_event.is_set():
+        try:
+            q.put_nowait(item)
+            return dropped
+        except queue.Full:
+            pass
+        try:
+            dropped += _size(q.get_nowait())
+        except queue.Empty:
+            pass
+    return dropped
+
+
+def _get(q, stop_event):
+    """
+    Blocking get that returns _END once the pipeline is stopped.
+    """
+    while not stop_event.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _END
+
+
+def run_serial(source, stages, sink=None, profiler=NULL_PROFILER):
+    """
+    Runs every stage for one frame before reading the next one, on the calling thread.
+    source is an iterable of items, sink(item) may return False to stop early.
+    profiler (see profiling.Profiler) receives the decode time and the finished frames.
+    Returns the throughput report.
+    """
+    decode = Stage('decode', None)
+    start = time.perf_counter()
+    iterator = iter(source)
+    while True:
+        t0 = time.perf_counter()
+        item = next(iterator, _END)
+        if item is _END:
+            break
+        elapsed, n = time.perf_counter() - t0, _size(item)
+        decode.busy += elapsed
+        decode.count += n
+        profiler.record('stage.decode', elapsed / n, n)
+        for stage in stages:
+            item = stage(item)
+        if sink is not None and sink(item) is False:
+            break
+        profiler.frame_done(n)
+    return throughput_report([decode] + list(stages), time.perf_counter() - start)
+
+
+def run_pipelined(source, stages, sink=None, queue_size=4, profiler=NULL_PROFILER, drop_stale=False):
+    """
+    Runs the source and each stage on its own thread, connected by bounded queues.
+    Every stage is a single thread reading a FIFO queue, so items stay in frame order.
+    With drop_stale (live sources) a producer facing a full queue drops its oldest
+    item instead of waiting, so no queue holds stale frames behind a slow stage;
+    the dropped frames are counted with the profiler as 'dropped.<consumer>'.
+    sink(item) runs on the calling thread (needed for cv2.imshow) and may return False to stop early.
+    profiler (see profiling.Profiler) receives the decode time, the finished frames
+    and the depth of each queue as 'queue.<consumer>' whenever an item is taken from it.
+    Returns the throughput report.
+    """
+    stop_event = threading.Event()
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    decode = Stage('decode', None)
+    errors = []
+
+    def read_source():
+        iterator = iter(source)
+        try:
+            while True:
+                t0 = time.perf_counter()
+                item = next(iterator, _END)
+                if item is _END:
+                    break
+                elapsed, n = time.perf_counter() - t0, _size(item)
+                decode.busy += elapsed
+                decode.count += n
+                profiler.record('stage.decode', elapsed / n, n)
+                if not put(queues[0], item, stages[0].name if stages else 'sink'):
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop_event.set()
+        _put(queues[0], _END, stop_event)
+
+    def put(q, item, consumer):
+        if not drop_stale:
+            return _put(q, item, stop_event)
+        dropped = _put_latest(q, item, stop_event)
+        if dropped:
+            profiler.count('dropped.' + consumer, dropped)
+        return not stop_event.is_set()
+
+    def run_stage(stage, in_q, out_q, consumer):
+        try:
+            while True:
+                item = _get(in_q, stop_event)
+                if item is _END:
+                    break
+                profiler.gauge('queue.' + stage.name, in_q.qsize() + 1) # including the item just taken
+                if not put(out_q, stage(item), consumer):
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop_event.set()
+        _put(out_q, _END, stop_event)
+
+    threads = [threading.Thread(target=read_source, name='decode', daemon=True)]
+    for i, stage in enumerate(stages):
+        consumer = stages[i + 1].name if i + 1 < len(stages) else 'sink'
+        threads.append(threading.Thread(target=run_stage, args=(stage, queues[i], queues[i + 1], consumer),
+                                        name=stage.name, daemon=True))
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    try:
+        while True:
+            item = _get(queues[-1], stop_event)
+            if item is _END:
+                break
+            profiler.gauge('queue.sink', queues[-1].qsize() + 1)
+            if sink is not None and sink(item) is False:
+                break
+            profiler.frame_done(_size(item))
+    finally:
+        stop_event.set()
+        for t in threads:
+            t.join()
+    if errors:
+        raise errors[0]
+    return throughput_report([decode] + list(stages), time.perf_counter() - start)
+
+
+def throughput_report(stages, wall_time):
+    """
+    Formats per-stage frame counts, time per frame and throughput.
+    """
+    frames = min(s.count for s in stages) if stages else 0
+    lines = [f"Processed {frames} frames in {wall_time:.2f}s ({frames / wall_time if wall_time > 0 else 0:.1f} FPS)"]
+    for s in stages:
+        ms = 1000 * s.busy / s.count if s.count else 0.0
+        fps = s.count / s.busy if s.busy > 0 else 0.0
+        util = 100 * s.busy / wall_time if wall_time > 0 else 0.0
+        lines.append(f"  {s.name:<8} {s.count:6d} frames  {ms:8.2f} ms/frame  {fps:8.1f} FPS  {util:5.1f}% busy")
+    return "\n".join(lines)
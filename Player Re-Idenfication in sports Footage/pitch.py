@@ -0,0 +1,108 @@
+"""
+Pitch coordinates: maps player positions from image pixels to metres on the pitch
+with a calibrated homography, one vectorised transform per frame.
+
+A calibration file is JSON with either the 3x3 image-to-pitch matrix
+    {"homography": [[...], [...], [...]]}
+or at least four image/pitch point correspondences (pitch points in metres),
+e.g. the corners of the penalty box clicked on one frame of the clip:
+    {"image_points": [[x, y], ...], "pitch_points": [[X, Y], ...]}
+"""
+import json
+import cv2
+import numpy as np
+
+# Rough scale for 720p broadcast footage, used when no calibration is given
+PIXEL_TO_METER_RATIO = 0.05
+
+
+def box_centers(boxes):
+    """
+    Integer center points (N, 2) of (N, 4) [x1, y1, x2, y2] boxes, as drawn on the overlay.
+    """
+    boxes = np.asarray(boxes, dtype=int).reshape(-1, 4)
+    return (boxes[:, :2] + boxes[:, 2:4]) // 2
+
+
+def foot_points(boxes):
+    """
+    Bottom-center points (N, 2) of (N, 4) boxes, where a player touches the pitch.
+    """
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    return np.column_stack(((boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]))
+
+
+def ball_distances(points, ball_coords):
+    """
+    Distances (N,) from every point to the ball in one vectorised computation;
+    inf for all points when the ball was not found.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if not ball_coords:
+        return np.full(len(points), np.inf)
+    return np.hypot(points[:, 0] - ball_coords[0], points[:, 1] - ball_coords[1])
+
+
+class PitchMapper:
+    """
+    Image-to-pitch mapping of player boxes.
+    With a homography the foot point of each box is projected onto the pitch plane,
+    so distances are real metres regardless of where on the pitch the player is.
+    Without one, box centers are scaled by a fixed pixel_to_meter_ratio as before.
+    """
+
+    def __init__(self, homography=None, pixel_to_meter_ratio=PIXEL_TO_METER_RATIO):
+        self.homography = None if homography is None else np.asarray(homography, dtype=float).reshape(3, 3)
+        self.pixel_to_meter_ratio = pixel_to_meter_ratio
+
+    @property
+    def calibrated(self):
+        return self.homography is not None
+
+    @classmethod
+    def from_points(cls, image_points, pitch_points):
+        """
+        Fits the homography to four or more image/pitch point correspondences.
+        """
+        image_points = np.asarray(image_points, dtype=np.float64).reshape(-1, 2)
+        pitch_points = np.asarray(pitch_points, dtype=np.float64).reshape(-1, 2)
+        if len(image_points) < 4 or len(image_points) != len(pitch_points):
+            raise ValueError("Pitch calibration needs at least 4 matching image and pitch points")
+        homography, _ = cv2.findHomography(image_points, pitch_points, 0)
+        if homography is None:
+            raise ValueError("Pitch calibration points are degenerate (e.g. collinear)")
+        return cls(homography)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a calibration file (see the module docstring).
+        """
+        with open(path) as f:
+            calib = json.load(f)
+        if 'homography' in calib:
+            return cls(calib['homography'])
+        return cls.from_points(calib['image_points'], calib['pitch_points'])
+
+    def to_pitch(self, points):
+        """
+        Projects (N, 2) image points to (N, 2) pitch coordinates in metres.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        if self.homography is None:
+            return points * self.pixel_to_meter_ratio
+        H = self.homography
+        projected = points @ H[:2, :2].T + H[:2, 2]
+        w = points @ H[2, :2] + H[2, 2]
+        return projected / w[:, None]
+
+    def locate(self, boxes, camera_offset=(0.0, 0.0)):
+        """
+        Pitch positions (N, 2) in metres of the players in (N, 4) boxes.
+        camera_offset is the scene shift accumulated by camera pans since the
+        (calibration) first frame, subtracted from the image points first.
+        """
+        offset = np.asarray(camera_offset, dtype=float)
+        if self.homography is None:
+            return (box_centers(boxes) - offset) * self.pixel_to_meter_ratio
+        return self.to_pitch(foot_points(boxes) - offset)
@@ -0,0 +1,238 @@
+"""
+Run-time instrumentation for the analysis pipeline.
+
+A Profiler collects latency histograms of the pipeline stages (recorded by the
+pipeline runners as 'stage.<name>': decode, detect, camera, track, render) and of
+the steps inside them (yolo, boxes, sort, clip, classify, draw, encode), queue
+depths between the stages, counters such as CLIP calls and gauges such as the
+active track count. It prints a one-line status every log_every seconds and
+produces a JSON-serialisable summary at the end of the run.
+
+Everything that takes a profiler defaults to NULL_PROFILER, which records nothing.
+"""
+import bisect
+import cProfile
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Histogram bucket upper edges in seconds: 50 us to ~50 s, 8 buckets per decade
+BUCKET_EDGES = [5e-5 * 10 ** (i / 8) for i in range(49)]
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram with exact count, total and max.
+    Percentiles are read off the bucket edges (within ~33% of the true value).
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_EDGES) + 1) # the last bucket is open-ended
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds, n=1):
+        self.buckets[bisect.bisect_left(BUCKET_EDGES, seconds)] += n
+        self.count += n
+        self.total += seconds * n
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q):
+        """
+        Upper edge of the bucket holding the q-th percentile (0-100), in seconds,
+        capped at the largest recorded value.
+        """
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKET_EDGES[i], self.max) if i < len(BUCKET_EDGES) else self.max
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self):
+        ms = 1000
+        return {'count': self.count, 'total_s': round(self.total, 4), 'mean_ms': round(ms * self.mean, 3),
+                'p50_ms': round(ms * self.percentile(50), 3), 'p95_ms': round(ms * self.percentile(95), 3),
+                'p99_ms': round(ms * self.percentile(99), 3), 'max_ms': round(ms * self.max, 3),
+                'buckets_ms': {f"{ms * edge:.3g}": n for edge, n in zip(BUCKET_EDGES + [float('inf')], self.buckets)
+                               if n}}
+
+
+class Gauge:
+    """
+    Sampled value (queue depth, active tracks): last, mean and max of the samples.
+    """
+
+    def __init__(self):
+        self.last = 0
+        self.total = 0
+        self.samples = 0
+        self.max = 0
+
+    def set(self, value):
+        self.last = value
+        self.total += value
+        self.samples += 1
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.total / self.samples if self.samples else 0.0
+
+    def to_dict(self):
+        return {'last': self.last, 'mean': round(self.mean, 3), 'max': self.max}
+
+
+class Profiler:
+    """
+    Thread-safe collector for the pipeline stages; see the module docstring.
+    Latencies are per frame: a stage that handled a batch of n frames records
+    its time divided by n, n times. log_every=0 turns the periodic line off.
+    """
+
+    def __init__(self, log_every=10.0, log=print):
+        self.log_every = log_every
+        self.log = log
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.frames = 0
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._last_log = self._start
+        self._last_frames = 0
+
+    def record(self, name, seconds, n=1):
+        """
+        Records n frames that each took seconds in the named stage.
+        """
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = LatencyHistogram()
+            hist.record(seconds, n)
+
+    @contextmanager
+    def time(self, name, n=1):
+        """
+        Times the body as n frames of the named stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) / max(n, 1), n)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        with self._lock:
+            gauge = self.gauges.get(name)
+            if gauge is None:
+                gauge = self.gauges[name] = Gauge()
+            gauge.set(value)
+
+    def frame_done(self, n=1):
+        """
+        Counts finished frames and prints the status line when it is due.
+        Call from a single thread (the pipeline sink).
+        """
+        self.frames += n
+        if self.log_every and time.perf_counter() - self._last_log >= self.log_every:
+            self.log(self.status_line())
+
+    def status_line(self):
+        """
+        One line with the throughput since the last line, per-stage p50, the
+        current queue depths (in batches), CLIP calls per frame so far and active tracks.
+        """
+        now = time.perf_counter()
+        with self._lock:
+            window = now - self._last_log
+            fps = (self.frames - self._last_frames) / window if window > 0 else 0.0
+            self._last_log, self._last_frames = now, self.frames
+            stages = " ".join(f"{name[6:]} {1000 * hist.percentile(50):.1f}"
+                              for name, hist in self.histograms.items() if name.startswith('stage.'))
+            queues = " ".join(f"{name[6:]} {gauge.last}" for name, gauge in self.gauges.items()
+                              if name.startswith('queue.'))
+            clip = self.counters.get('clip_calls', 0) / self.frames if self.frames else 0.0
+            tracks = self.gauges['active_tracks'].last if 'active_tracks' in self.gauges else 0
+        return (f"[profile] {self.frames} frames, {fps:.1f} FPS | p50 ms: {stages} | queues: {queues or '-'} | "
+                f"CLIP {clip:.2f} calls/frame | {tracks} active tracks")
+
+    def summary(self):
+        """
+        Returns everything recorded as a JSON-serialisable dict.
+        """
+        wall = time.perf_counter() - self._start
+        with self._lock:
+            counters = dict(self.counters)
+            per_frame = {name: round(n / self.frames, 4) for name, n in counters.items()} if self.frames else {}
+            stages = {name[6:]: hist.to_dict() for name, hist in self.histograms.items() if name.startswith('stage.')}
+            steps = {name: hist.to_dict() for name, hist in self.histograms.items() if not name.startswith('stage.')}
+            gauges = {name: gauge.to_dict() for name, gauge in self.gauges.items()}
+        # The stage with the most busy time limits the pipelined throughput
+        busiest = max(stages, key=lambda name: stages[name]['total_s']) if stages else None
+        return {'frames': self.frames, 'wall_s': round(wall, 3),
+                'fps': round(self.frames / wall, 2) if wall > 0 else 0.0,
+                'bottleneck': busiest, 'stages': stages, 'steps': steps, 'counters': counters,
+                'counters_per_frame': per_frame, 'gauges': gauges}
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+class NullProfiler:
+    """
+    Profiler stand-in that records nothing.
+    """
+    log_every = 0
+
+    def record(self, name, seconds, n=1):
+        pass
+
+    def time(self, name, n=1):
+        return nullcontext()
+
+    def count(self, name, n=1):
+        pass
+
+    def gauge(self, name, value):
+        pass
+
+    def frame_done(self, n=1):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+@contextmanager
+def cprofile(path):
+    """
+    Runs the body under cProfile and dumps the stats to path (open with pstats or snakeviz).
+    cProfile only sees the calling thread, so profile the serial pipeline; for the
+    threaded one attach py-spy instead (py-spy record --pid <pid>), whose samples
+    carry the stage names as thread names.
+    """
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
@@ -0,0 +1,132 @@
+import numpy as np
+from sort.sort import iou_batch, linear_assignment
+
+
+class ReIDGallery:
+    """
+    Appearance gallery of recently lost tracks, so a player who reappears after an
+    occlusion gets their old ID back instead of a new one.
+    L2-normalised embeddings live in one contiguous (capacity, D) matrix, with the
+    player ID, team, last box and the frame it was lost at stored alongside.
+    Entries older than max_age frames are evicted.
+    """
+
+    def __init__(self, max_age=125, capacity=256, sim_threshold=0.9, iou_threshold=0.3,
+                 iou_max_gap=10, max_shift=25.0):
+        self.max_age = max_age
+        self.capacity = capacity
+        self.sim_threshold = sim_threshold   # min cosine similarity for an appearance match
+        self.iou_threshold = iou_threshold   # min IoU with the last box for a cheap match
+        self.iou_max_gap = iou_max_gap       # frames a track may be lost and still match on IoU
+        self.max_shift = max_shift           # max pixels a player may move per lost frame
+        self.embeddings = None               # allocated on the first add, once D is known
+        self.ids = np.zeros(capacity, dtype=int)
+        self.teams = np.zeros(capacity, dtype=int)
+        self.boxes = np.zeros((capacity, 4))
+        self.lost_at = np.zeros(capacity, dtype=int)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _keep(self, mask):
+        """
+        Compacts the live entries to the ones selected by a boolean mask.
+        """
+        n = int(mask.sum())
+        if n == self.size:
+            return
+        for arr in (self.embeddings, self.ids, self.teams, self.boxes, self.lost_at):
+            if arr is not None:
+                arr[:n] = arr[:self.size][mask]
+        self.size = n
+
+    def add(self, player_id, embedding, bbox, frame_index, team_id=-1):
+        """
+        Stores a lost track. When full, the entry lost longest ago is dropped.
+        """
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        if self.embeddings is None:
+            self.embeddings = np.zeros((self.capacity, embedding.shape[0]), dtype=np.float32)
+        self.remove(player_id)
+        if self.size == self.capacity:
+            keep = np.ones(self.size, dtype=bool)
+            keep[np.argmin(self.lost_at[:self.size])] = False
+            self._keep(keep)
+        i = self.size
+        self.embeddings[i] = embedding / max(np.linalg.norm(embedding), 1e-12)
+        self.ids[i] = player_id
+        self.teams[i] = team_id
+        self.boxes[i] = bbox[:4]
+        self.lost_at[i] = frame_index
+        self.size += 1
+
+    def remove(self, player_id):
+        """
+        Drops the entry of a player (e.g. when their track came back on its own).
+        """
+        if self.size:
+            self._keep(self.ids[:self.size] != player_id)
+
+    def evict(self, frame_index):
+        """
+        Drops the entries lost more than max_age frames ago.
+        """
+        if self.size:
+            self._keep(frame_index - self.lost_at[:self.size] <= self.max_age)
+
+    def _plausible(self, bboxes, frame_index):
+        """
+        (N, size) mask of gallery entries a new box could be: the box center must be
+        within max_shift pixels per frame since the entry was lost.
+        """
+        centers = (bboxes[:, :2] + bboxes[:, 2:4]) / 2
+        lost_centers = (self.boxes[:self.size, :2] + self.boxes[:self.size, 2:4]) / 2
+        dist = np.linalg.norm(centers[:, None, :] - lost_centers[None, :, :], axis=2)
+        gap = frame_index - self.lost_at[:self.size]
+        return dist <= self.max_shift * np.maximum(gap, 1)[None, :]
+
+    def _assign(self, scores, threshold):
+        """
+        One-to-one assignment of new tracks to gallery entries above a score threshold.
+        Returns the matched player ID per row (-1 if none) and removes the matched entries.
+        """
+        result = np.full(scores.shape[0], -1, dtype=int)
+        if scores.size == 0:
+            return result
+        matched = linear_assignment(-scores)
+        matched = matched[scores[matched[:, 0], matched[:, 1]] >= threshold]
+        result[matched[:, 0]] = self.ids[matched[:, 1]]
+        keep = np.ones(self.size, dtype=bool)
+        keep[matched[:, 1]] = False
+        self._keep(keep)
+        return result
+
+    def match_iou(self, bboxes, frame_index):
+        """
+        Cheap match of new boxes against the last boxes of tracks lost within
+        iou_max_gap frames, before any embedding is computed.
+        """
+        bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+        if self.size == 0 or len(bboxes) == 0:
+            return np.full(len(bboxes), -1, dtype=int)
+        recent = (frame_index - self.lost_at[:self.size]) <= self.iou_max_gap
+        iou = iou_batch(bboxes, self.boxes[:self.size]) * recent[None, :]
+        return self._assign(iou, self.iou_threshold)
+
+    def match(self, embeddings, bboxes, frame_index, team_ids=None):
+        """
+        Matches new tracks against the gallery with one matrix multiply of normalised
+        embeddings, restricted to plausible positions and (if given) the same team.
+        Returns the matched player ID per track, or -1 for tracks that need a new ID.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(bboxes), -1)
+        bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+        if self.size == 0 or len(bboxes) == 0:
+            return np.full(len(bboxes), -1, dtype=int)
+        norms = np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        sims = (embeddings / norms) @ self.embeddings[:self.size].T
+        allowed = self._plausible(bboxes, frame_index)
+        if team_ids is not None:
+            allowed &= np.asarray(team_ids)[:, None] == self.teams[None, :self.size]
+        return self._assign(np.where(allowed, sims, -1.0), self.sim_threshold)
@@ -0,0 +1,109 @@
+"""
+Replays the per-frame track records of an analytics-only run onto its video,
+producing the same overlay the live run draws without re-running detection,
+tracking or CLIP.
+
+    python "main code.py" --analytics-only
+    python render_stats.py videos/15sec_input_720p.mp4 results/final_tracks.parquet results/final_stats_overlay.mp4
+"""
+import cv2
+import argparse
+import numpy as np
+from collections import defaultdict
+from analytics import FrameStats, TEAM_COLORS, possession_percentages
+from overlay import OverlayRenderer
+from stats_writer import BALL_TRACK_ID, CAMERA_TRACK_ID, read_track_stats
+
+
+def iter_frame_stats(columns):
+    """
+    Rebuilds the FrameStats snapshots from the columns of a track stats file.
+    Yields (frame_index, FrameStats) in frame order, only for frames with records;
+    possession is accumulated from the near_ball rows as during the live run, and
+    the camera motion is the one recorded with the frame.
+    """
+    order = np.argsort(columns['frame'], kind='stable')
+    columns = {name: arr[order] for name, arr in columns.items()}
+    frames, starts = np.unique(columns['frame'], return_index=True)
+    bounds = np.append(starts, len(columns['frame']))
+    rows = list(zip(*(columns[name].tolist() for name in
+                      ('track_id', 'x1', 'y1', 'x2', 'y2', 'team_id', 'speed_kmph', 'distance_m', 'near_ball',
+                       'camera_dx', 'camera_dy'))))
+
+    ball_possession_time = defaultdict(int)
+    for frame_index, lo, hi in zip(frames.tolist(), bounds[:-1], bounds[1:]):
+        players = []
+        ball_coords = None
+        camera_motion = tuple(rows[lo][-2:])
+        for track_id, x1, y1, x2, y2, team_id, speed, dist, near_ball, _, _ in rows[lo:hi]:
+            if track_id == CAMERA_TRACK_ID:
+                continue
+            if track_id == BALL_TRACK_ID:
+                ball_coords = (x1, y1)
+                continue
+            center_pos = ((x1 + x2) // 2, (y1 + y2) // 2)
+            if near_ball:
+                ball_possession_time[team_id] += 1
+            players.append((track_id, (x1, y1, x2, y2), center_pos, team_id, speed, dist, near_ball))
+        yield frame_index, FrameStats(frame_index, players, ball_coords, possession_percentages(ball_possession_time),
+                                      camera_motion)
+
+
+def render_stats(video_path, stats_path, output_path, show=False):
+    """
+    Draws the recorded stats onto every frame of the video and writes the result.
+    Returns the number of frames written.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video file {video_path}")
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = int(cap.get(cv2.CAP_PROP_FPS)) or 25
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (frame_width, frame_height))
+
+    renderer = OverlayRenderer(TEAM_COLORS)
+    records = iter_frame_stats(read_track_stats(stats_path))
+    pending = next(records, None)
+    # Frames without records still get the (unchanged) possession panel
+    stats = FrameStats(0, [], None, possession_percentages({}))
+    frame_index = 0
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_index += 1 # MatchAnalytics numbers frames from 1
+            if pending is not None and pending[0] == frame_index:
+                stats = pending[1]
+                pending = next(records, None)
+            else:
+                stats = FrameStats(frame_index, [], None, stats.possession)
+            renderer.render(frame, stats)
+            out.write(frame)
+            if show:
+                cv2.imshow("Match Analytics", frame)
+                if cv2.waitKey(1) & 0xFF == ord("q"):
+                    break
+    finally:
+        cap.release()
+        out.release()
+        if show:
+            cv2.destroyAllWindows()
+    return frame_index
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(description='Replay recorded track stats onto a video')
+    parser.add_argument('video', help='Source video of the analytics run')
+    parser.add_argument('stats', help='Track stats written by the run (.parquet file or _npz directory)')
+    parser.add_argument('output', help='Output MP4 with the overlay')
+    parser.add_argument('--show', action='store_true', help='Display the frames while rendering')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    n = render_stats(args.video, args.stats, args.output, args.show)
+    print(f"Rendered {n} frames to {args.output}.")
@@ -0,0 +1,140 @@
+import os
+import glob
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# One record per frame per track. The ball is written as its own record with
+# track_id BALL_TRACK_ID, team_id -1 and a zero-size box at its center.
+# camera_dx/camera_dy are the frame's camera motion, repeated on each of its
+# records; a frame with neither tracks nor ball gets one CAMERA_TRACK_ID record
+# to carry it.
+COLUMNS = [
+    ('frame', np.int32),
+    ('track_id', np.int32),
+    ('x1', np.int32),
+    ('y1', np.int32),
+    ('x2', np.int32),
+    ('y2', np.int32),
+    ('team_id', np.int8),
+    ('speed_kmph', np.float32),
+    ('distance_m', np.float32),
+    ('near_ball', np.bool_),
+    ('camera_dx', np.float32),
+    ('camera_dy', np.float32),
+]
+BALL_TRACK_ID = -1
+CAMERA_TRACK_ID = -2
+
+
+def default_stats_path(base):
+    """
+    Returns base + '.parquet' when pyarrow is installed, else a directory of .npz chunks.
+    """
+    return base + ('.parquet' if pa is not None else '_npz')
+
+
+class TrackStatsWriter:
+    """
+    Streams per-frame track records into a columnar file.
+    Rows are buffered in preallocated column arrays and written one chunk at a time,
+    as a Parquet row group (path ending in .parquet, needs pyarrow) or as one
+    part-NNNNN.npz file in a directory (any other path), so the whole match is
+    never held in memory.
+    """
+
+    def __init__(self, path, chunk_size=65536):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.parquet = path.endswith('.parquet')
+        if self.parquet and pa is None:
+            raise ImportError("Writing .parquet track stats requires pyarrow")
+        if self.parquet:
+            schema = pa.schema([(name, pa.from_numpy_dtype(dtype)) for name, dtype in COLUMNS])
+            self._writer = pq.ParquetWriter(path, schema)
+        else:
+            os.makedirs(path, exist_ok=True)
+            for old in glob.glob(os.path.join(path, 'part-*.npz')):
+                os.remove(old)
+            self._writer = None
+        self._buffer = {name: np.zeros(chunk_size, dtype=dtype) for name, dtype in COLUMNS}
+        self._size = 0
+        self._parts = 0
+        self.rows = 0
+
+    def _append(self, frame, track_id, box, team_id, speed, distance, near_ball, camera_motion):
+        if self._size == self.chunk_size:
+            self.flush()
+        i = self._size
+        b = self._buffer
+        b['frame'][i] = frame
+        b['track_id'][i] = track_id
+        b['x1'][i], b['y1'][i], b['x2'][i], b['y2'][i] = box
+        b['team_id'][i] = team_id
+        b['speed_kmph'][i] = speed
+        b['distance_m'][i] = distance
+        b['near_ball'][i] = near_ball
+        b['camera_dx'][i], b['camera_dy'][i] = camera_motion
+        self._size += 1
+
+    def write(self, stats):
+        """
+        Appends the records of one FrameStats snapshot.
+        """
+        camera_motion = stats.camera_motion
+        for track_id, box, _, team_id, speed, dist, near_ball in stats.players:
+            self._append(stats.frame_index, track_id, box, team_id, speed, dist, near_ball, camera_motion)
+        if stats.ball_coords:
+            bx, by = stats.ball_coords
+            self._append(stats.frame_index, BALL_TRACK_ID, (bx, by, bx, by), -1, 0.0, 0.0, False, camera_motion)
+        elif not stats.players:
+            self._append(stats.frame_index, CAMERA_TRACK_ID, (0, 0, 0, 0), -1, 0.0, 0.0, False, camera_motion)
+
+    def flush(self):
+        """
+        Writes the buffered rows as one chunk.
+        """
+        if self._size == 0:
+            return
+        columns = {name: arr[:self._size] for name, arr in self._buffer.items()}
+        if self.parquet:
+            self._writer.write_table(pa.table(columns))
+        else:
+            np.savez(os.path.join(self.path, f"part-{self._parts:05d}.npz"), **columns)
+        self._parts += 1
+        self.rows += self._size
+        self._size = 0
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def read_track_stats(path, columns=None):
+    """
+    Loads a track stats file written by TrackStatsWriter as a dict of column arrays.
+    Columns missing from files written before they were added are read as zeros.
+    """
+    names = columns or [name for name, _ in COLUMNS]
+    dtypes = dict(COLUMNS)
+    if path.endswith('.parquet'):
+        if pa is None:
+            raise ImportError("Reading .parquet track stats requires pyarrow")
+        present = set(pq.read_schema(path).names)
+        table = pq.read_table(path, columns=[name for name in names if name in present])
+        return {name: table.column(name).to_numpy() if name in present
+                else np.zeros(table.num_rows, dtype=dtypes[name]) for name in names}
+    parts = sorted(glob.glob(os.path.join(path, 'part-*.npz')))
+    data = {name: [] for name in names}
+    for part in parts:
+        with np.load(part) as chunk:
+            rows = len(chunk[chunk.files[0]])
+            for name in names:
+                data[name].append(chunk[name] if name in chunk.files else np.zeros(rows, dtype=dtypes[name]))
+    return {name: np.concatenate(arrs) if arrs else np.empty(0, dtype=dtypes[name]) for name, arrs in data.items()}
@@ -0,0 +1,137 @@
+import cv2
+import hashlib
+import numpy as np
+import torch
+import open_clip
+from profiling import NULL_PROFILER
+
+# Prompts for jersey classification
+PROMPTS = [
+    "a football player wearing a red Manchester United jersey",
+    "a football player wearing a blue Manchester City jersey",
+    "a football referee wearing black"
+]
+
+# Part of the cache tag: embeddings made by an earlier _resize_crop are not reused
+PREPROCESS_VERSION = "cv2-area-down"
+
+
+class TeamClassifier:
+    """
+    Batched CLIP jersey classifier.
+    Text features for the fixed prompts are encoded once at startup, and all
+    crops of a frame are preprocessed into one tensor and encoded in a single
+    forward pass.
+    """
+
+    def __init__(self, device=None, model_name='ViT-B-32', pretrained='openai', prompts=PROMPTS):
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        # Identifies the model and prompts, e.g. to keep cached results of different setups apart
+        self.tag = hashlib.sha1("|".join([model_name, pretrained, PREPROCESS_VERSION] + list(prompts)).encode()).hexdigest()[:12]
+        self.model, _, self.preprocess = open_clip.create_model_and_transforms(model_name, pretrained=pretrained)
+        self.model = self.model.to(self.device).eval()
+        tokenizer = open_clip.get_tokenizer(model_name)
+
+        # Input size and normalisation used by the model's own preprocess transform
+        image_size = self.model.visual.image_size
+        self.image_size = image_size[0] if isinstance(image_size, (tuple, list)) else int(image_size)
+        mean = getattr(self.model.visual, 'image_mean', None) or open_clip.OPENAI_DATASET_MEAN
+        std = getattr(self.model.visual, 'image_std', None) or open_clip.OPENAI_DATASET_STD
+        self.mean = torch.tensor(mean, device=self.device).view(1, 3, 1, 1)
+        self.std = torch.tensor(std, device=self.device).view(1, 3, 1, 1)
+
+        # Cache normalised text features for the prompts
+        with torch.no_grad():
+            text_features = self.model.encode_text(tokenizer(prompts).to(self.device))
+            self.text_features = text_features / text_features.norm(dim=-1, keepdim=True)
+
+    def _resize_crop(self, img_crop):
+        """
+        Resizes the shortest side to the model input size and center crops it,
+        like the CLIP preprocess transform. PIL's bicubic antialiases when it
+        shrinks and cv2's does not, so downscales use INTER_AREA instead;
+        parity() measures how closely this follows self.preprocess.
+        """
+        size = self.image_size
+        h, w = img_crop.shape[:2]
+        if h <= w:
+            new_h, new_w = size, int(size * w / h)
+        else:
+            new_h, new_w = int(size * h / w), size
+        interpolation = cv2.INTER_AREA if new_h < h else cv2.INTER_CUBIC
+        resized = cv2.resize(img_crop, (new_w, new_h), interpolation=interpolation)
+        top = int(round((new_h - size) / 2.0))
+        left = int(round((new_w - size) / 2.0))
+        return resized[top:top + size, left:left + size]
+
+    def preprocess_batch(self, crops):
+        """
+        Converts a list of BGR crops into one normalised (N, 3, H, W) tensor.
+        """
+        batch = np.stack([self._resize_crop(c) for c in crops])[..., ::-1]  # BGR -> RGB
+        tensor = torch.from_numpy(np.ascontiguousarray(batch)).to(self.device)
+        tensor = tensor.permute(0, 3, 1, 2).float().div_(255.0)
+        return (tensor - self.mean) / self.std
+
+    def parity(self, crops):
+        """
+        Compares preprocess_batch with the model's own PIL preprocess on sample
+        BGR crops. Returns (fraction of crops classified into the same team,
+        largest absolute difference between the input tensors).
+        """
+        from PIL import Image
+        fast = self.preprocess_batch(crops)
+        reference = torch.stack([self.preprocess(Image.fromarray(np.ascontiguousarray(c[..., ::-1])))
+                                 for c in crops]).to(self.device)
+        with torch.no_grad():
+            teams = [self.classify(self.model.encode_image(t).float().cpu().numpy()) for t in (fast, reference)]
+        return float((teams[0] == teams[1]).mean()), float((fast - reference).abs().max())
+
+    def embed(self, crops):
+        """
+        Generates CLIP embeddings for a list of crops in one forward pass.
+        Returns an (N, D) float32 array and a boolean mask of the crops that
+        were valid; rows of invalid crops are left as zeros.
+        """
+        valid = np.array([c is not None and c.shape[0] > 0 and c.shape[1] > 0 for c in crops], dtype=bool)
+        embeddings = np.zeros((len(crops), self.text_features.shape[1]), dtype=np.float32)
+        if valid.any():
+            image_input = self.preprocess_batch([c for c, ok in zip(crops, valid) if ok])
+            with torch.no_grad():
+                embeddings[valid] = self.model.encode_image(image_input).float().cpu().numpy()
+        return embeddings, valid
+
+    def classify(self, embeddings):
+        """
+        Classifies the team of each embedding against the cached prompt features.
+        """
+        if len(embeddings) == 0:
+            return np.empty(0, dtype=int)
+        with torch.no_grad():
+            image_tensor = torch.from_numpy(np.asarray(embeddings, dtype=np.float32)).to(self.device)
+            image_tensor = image_tensor / image_tensor.norm(dim=-1, keepdim=True)
+            logits = image_tensor @ self.text_features.float().T
+            return logits.argmax(dim=-1).cpu().numpy().astype(int)
+
+    def classify_crops(self, crops, profiler=NULL_PROFILER):
+        """
+        Embeds and classifies all crops of a frame.
+        Returns (embeddings, team_ids, valid) where team_ids is -1 for invalid crops.
+        The two steps are timed with the profiler as 'clip' and 'classify', and
+        the calls and crops counted as 'clip_calls' and 'clip_crops'.
+        """
+        profiler.count('clip_calls')
+        profiler.count('clip_crops', len(crops))
+        with profiler.time('clip'):
+            embeddings, valid = self.embed(crops)
+        with profiler.time('classify'):
+            team_ids = np.full(len(crops), -1, dtype=int)
+            team_ids[valid] = self.classify(embeddings[valid])
+        return embeddings, team_ids, valid
+
+if __name__ == "__main__":
+    import sys
+    # Usage: python team_classifier.py crop.png [crop.png ...]
+    crops = [cv2.imread(path) for path in sys.argv[1:]]
+    agreement, max_diff = TeamClassifier().parity([c for c in crops if c is not None])
+    print(f"team agreement with the PIL preprocess: {agreement:.1%}, max input difference {max_diff:.4f}")
@@ -0,0 +1,141 @@
+import numpy as np
+
+# Live per-player state, one row per player in a dense slot
+STATE_DTYPE = np.dtype([
+    ('player_id', np.int64),
+    ('team_id', np.int16),
+    ('first_seen', np.int64),
+    ('last_seen', np.int64),
+    ('speed', np.float64),      # km/h over the last step
+    ('distance', np.float64),   # meters covered
+    ('pos', np.float64, 2),     # last pitch position (meters), valid if has_pos
+    ('has_pos', np.bool_),
+    ('box', np.int32, 4),       # last seen bbox
+])
+
+# What is kept of a player after eviction, for the end-of-match summary
+RETIRED_FIELDS = ['player_id', 'team_id', 'first_seen', 'last_seen', 'speed', 'distance']
+RETIRED_DTYPE = np.dtype([(name, STATE_DTYPE[name]) for name in RETIRED_FIELDS])
+
+
+class TrackTable:
+    """
+    Per-player state of the live tracks in NumPy struct arrays.
+    Each player owns a dense slot (row) while live; speed, distance, position and
+    last-seen of all players of a frame are updated with one fancy-indexed
+    assignment per field. Players unseen for evict_after frames are compacted out,
+    and only their summary fields are kept (see records()), so memory stays
+    bounded by the live players rather than by the ID churn of the whole match.
+    """
+
+    def __init__(self, evict_after=250, capacity=64):
+        self.evict_after = evict_after
+        self.rows = np.zeros(capacity, dtype=STATE_DTYPE)
+        self.embeddings = None      # (capacity, D) float32, allocated on the first add
+        self.size = 0
+        self.slots = {}             # player ID -> slot
+        self._retired = np.zeros(capacity, dtype=RETIRED_DTYPE) # evicted players, doubled when full
+        self._n_retired = 0
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, player_id):
+        return player_id in self.slots
+
+    def _grow(self):
+        capacity = 2 * len(self.rows)
+        rows = np.zeros(capacity, dtype=STATE_DTYPE)
+        rows[:self.size] = self.rows[:self.size]
+        self.rows = rows
+        embeddings = np.zeros((capacity, self.embeddings.shape[1]), dtype=np.float32)
+        embeddings[:self.size] = self.embeddings[:self.size]
+        self.embeddings = embeddings
+
+    def add(self, player_id, team_id, embedding, bbox, frame_index):
+        """
+        Adds a new player and returns their slot.
+        """
+        embedding = np.asarray(embedding, dtype=np.float32).ravel()
+        if self.embeddings is None:
+            self.embeddings = np.zeros((len(self.rows), embedding.shape[0]), dtype=np.float32)
+        if self.size == len(self.rows):
+            self._grow()
+        i = self.size
+        self.rows[i] = (player_id, team_id, frame_index, frame_index, 0.0, 0.0, (0.0, 0.0), False, bbox[:4])
+        self.embeddings[i] = embedding
+        self.slots[player_id] = i
+        self.size += 1
+        return i
+
+    def slots_of(self, player_ids):
+        """
+        Slots (N,) of live players.
+        """
+        return np.array([self.slots[p] for p in player_ids], dtype=int)
+
+    def reset_position(self, player_id):
+        """
+        Forgets the last position of a player, so the next step does not count towards speed and distance.
+        """
+        self.rows['has_pos'][self.slots[player_id]] = False
+
+    def previous_positions(self, slots, default):
+        """
+        Last pitch positions (N, 2) of the players in slots, default rows where unknown,
+        and the mask of the players that had one.
+        """
+        has_pos = self.rows['has_pos'][slots]
+        return np.where(has_pos[:, None], self.rows['pos'][slots], default), has_pos
+
+    def update(self, slots, boxes, positions, speeds, distances, moved, frame_index):
+        """
+        Bulk update of all players seen this frame; speed and distance only change
+        for the moved rows (players that had a previous position).
+        """
+        rows = self.rows
+        rows['last_seen'][slots] = frame_index
+        rows['box'][slots] = boxes
+        rows['pos'][slots] = positions
+        rows['has_pos'][slots] = True
+        moved_slots = slots[moved]
+        rows['speed'][moved_slots] = speeds[moved]
+        rows['distance'][moved_slots] += distances[moved]
+
+    def evict(self, frame_index):
+        """
+        Drops the players unseen for more than evict_after frames.
+        Returns their player IDs.
+        """
+        if self.size == 0:
+            return []
+        keep = frame_index - self.rows['last_seen'][:self.size] <= self.evict_after
+        n = int(keep.sum())
+        if n == self.size:
+            return []
+        live = self.rows[:self.size]
+        gone = live[~keep]
+        self._retire(gone)
+        self.rows[:n] = live[keep]
+        self.embeddings[:n] = self.embeddings[:self.size][keep]
+        self.size = n
+        self.slots = {int(p): i for i, p in enumerate(self.rows['player_id'][:n])}
+        return gone['player_id'].tolist()
+
+    def _retire(self, gone):
+        end = self._n_retired + len(gone)
+        if end > len(self._retired):
+            retired = np.zeros(max(end, 2 * len(self._retired)), dtype=RETIRED_DTYPE)
+            retired[:self._n_retired] = self._retired[:self._n_retired]
+            self._retired = retired
+        self._retired[self._n_retired:end] = gone[RETIRED_FIELDS]
+        self._n_retired = end
+
+    def records(self):
+        """
+        Summary fields of every player of the match, live or evicted, by player ID.
+        """
+        records = np.zeros(self._n_retired + self.size, dtype=RETIRED_DTYPE)
+        records[:self._n_retired] = self._retired[:self._n_retired]
+        records[self._n_retired:] = self.rows[:self.size][RETIRED_FIELDS]
+        return records[np.argsort(records['player_id'], kind='stable')]